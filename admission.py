@@ -0,0 +1,168 @@
+import asyncio
+import functools
+import heapq
+import itertools
+import os
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+
+import metrics
+
+# --- CONFIGURATION ---
+# Expensive (AI) work admitted at once, and how many more may queue behind it.
+# Keep MAX_IN_FLIGHT + MAX_WAITING below BOT_CONCURRENT_UPDATES so that cheap
+# DB-only navigation always finds a free update slot.
+MAX_IN_FLIGHT = int(os.getenv('ADMISSION_MAX_IN_FLIGHT', '16'))
+MAX_WAITING = int(os.getenv('ADMISSION_MAX_WAITING', '32'))
+QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', '20'))
+MAX_BUCKETS = 10000
+
+# feature: (burst, seconds per extra token, queue priority; lower is served first)
+LIMITS = {
+    'ai_text': (5, 6, 1),
+    'explain': (10, 3, 1),
+    'translate': (5, 6, 1),
+    'document': (2, 30, 2),
+    'voice': (3, 20, 2),
+    'photo': (3, 20, 3),
+}
+
+RATE_LIMITED_MESSAGE = "⏳ អ្នកផ្ញើសំណើញឹកញាប់ពេក។ សូមរង់ចាំបន្តិច រួចព្យាយាមម្តងទៀត។"
+OVERLOADED_MESSAGE = "⚠️ ប្រព័ន្ធកំពុងមមាញឹកខ្លាំង។ សូមព្យាយាមម្តងទៀតក្នុងពេលបន្តិចទៀត។"
+
+
+class Rejected(Exception):
+    """Raised instead of running a request; str(e) is the Khmer message for the user."""
+
+
+class TokenBucket:
+    def __init__(self, burst, refill_seconds):
+        self.capacity = burst
+        self.refill_seconds = refill_seconds
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def try_take(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) / self.refill_seconds)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class AdmissionController:
+    """Per-user/feature token buckets plus a global priority queue for AI work."""
+
+    def __init__(self, limits=LIMITS, max_in_flight=MAX_IN_FLIGHT, max_waiting=MAX_WAITING,
+                 queue_timeout=QUEUE_TIMEOUT):
+        self.limits = limits
+        self.max_in_flight = max_in_flight
+        self.max_waiting = max_waiting
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self._buckets = {}
+        self._waiters = []
+        self._seq = itertools.count()
+        self.admitted = Counter()
+        self.rate_limited = Counter()
+        self.shed = Counter()
+
+    def _bucket(self, user_id, feature):
+        key = (user_id, feature)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= MAX_BUCKETS:
+                # Forget the oldest bucket; a returning user just starts with a full one
+                self._buckets.pop(next(iter(self._buckets)))
+            burst, refill, _ = self.limits[feature]
+            bucket = self._buckets[key] = TokenBucket(burst, refill)
+        return bucket
+
+    async def _acquire(self, priority):
+        if self.in_flight < self.max_in_flight and not self.waiting:
+            self.in_flight += 1
+            return
+        if self.waiting >= self.max_waiting:
+            raise Rejected(OVERLOADED_MESSAGE)
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self.waiting += 1
+        try:
+            # _release hands the slot over directly, so in_flight is already counted
+            await asyncio.wait_for(future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise Rejected(OVERLOADED_MESSAGE)
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+        finally:
+            self.waiting -= 1
+
+    def _release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def check_rate(self, user_id, feature):
+        """Per-user rate limit alone, for work handed to the job queue rather than run now."""
+        if not self._bucket(user_id, feature).try_take():
+            self.rate_limited[feature] += 1
+            raise Rejected(RATE_LIMITED_MESSAGE)
+
+    @asynccontextmanager
+    async def admit(self, user_id, feature):
+        """Rate-limit per user, then queue for a global AI slot by feature priority."""
+        self.check_rate(user_id, feature)
+        try:
+            await self._acquire(self.limits[feature][2])
+        except Rejected:
+            self.shed[feature] += 1
+            raise
+        self.admitted[feature] += 1
+        try:
+            yield
+        finally:
+            self._release()
+
+    def stats(self):
+        return {
+            'in_flight': self.in_flight,
+            'waiting': self.waiting,
+            'admitted': dict(self.admitted),
+            'rate_limited': dict(self.rate_limited),
+            'shed': dict(self.shed),
+        }
+
+
+controller = AdmissionController()
+
+metrics.collect('lawbot_admission_in_flight', 'AI requests holding an admission slot.', lambda: controller.in_flight)
+metrics.collect('lawbot_admission_waiting', 'AI requests queued for a slot.', lambda: controller.waiting)
+metrics.collect('lawbot_admission_rate_limited_total', 'Requests refused by a per-user bucket.',
+                lambda: controller.rate_limited, kind='counter', label='feature')
+metrics.collect('lawbot_admission_shed_total', 'Requests shed because the queue was full or too slow.',
+                lambda: controller.shed, kind='counter', label='feature')
+
+
+def rate_limited(feature):
+    """Handler decorator: check the per-user bucket and reply with the Khmer message on rejection.
+    Concurrency is bounded by the job workers, not by controller.admit()."""
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(update, context):
+            try:
+                controller.check_rate(update.effective_user.id, feature)
+            except Rejected as e:
+                await update.effective_message.reply_text(str(e))
+                return
+            return await handler(update, context)
+        return wrapper
+    return decorator
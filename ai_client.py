@@ -0,0 +1,188 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+
+import metrics
+from response_cache import FEATURE_TTLS, cache, make_key
+
+load_dotenv()
+
+# --- CONFIGURATION ---
+AI_MODEL = os.getenv('AI_MODEL', 'gpt-4o-mini')
+AI_TIMEOUT = float(os.getenv('AI_TIMEOUT', '60'))
+AI_MAX_CONCURRENCY = int(os.getenv('AI_MAX_CONCURRENCY', '10'))
+
+AI_ERROR_MESSAGE = "⚠️ AI មានបញ្ហាបច្ចេកទេស។"
+
+_client = None
+_max_concurrency = AI_MAX_CONCURRENCY
+_semaphore = asyncio.Semaphore(AI_MAX_CONCURRENCY)
+# Identical prompts already being answered share the one API call
+_in_flight = {}
+_active_calls = 0
+
+
+def get_client():
+    """Create the AsyncOpenAI client on first use."""
+    global _client
+    if _client is None:
+        from openai import AsyncOpenAI
+        _client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'), timeout=AI_TIMEOUT)
+    return _client
+
+
+def configure(client=None, max_concurrency=None, timeout=None):
+    """Swap the client (e.g. a fake for load tests) or change the limits."""
+    global _client, _semaphore, _max_concurrency, AI_TIMEOUT
+    if client is not None:
+        _client = client
+    if max_concurrency is not None:
+        _max_concurrency = max_concurrency
+        _semaphore = asyncio.Semaphore(max_concurrency)
+    if timeout is not None:
+        AI_TIMEOUT = timeout
+
+
+async def ask_chatgpt(messages, temperature=0.7, feature=None, on_progress=None):
+    """Ask the chat model. Answers for a `feature` listed in FEATURE_TTLS are cached.
+    With `on_progress`, the answer is streamed and the coroutine is awaited with the text so far."""
+    if feature not in FEATURE_TTLS:
+        return await _ask_chatgpt(messages, temperature, on_progress)
+
+    key = make_key(feature, AI_MODEL, messages, temperature)
+    cached = await cache.get(feature, key)
+    if cached is not None:
+        return cached
+    if key in _in_flight:
+        return await asyncio.shield(_in_flight[key])
+
+    progress = _Progress(on_progress) if on_progress is not None else None
+    task = asyncio.ensure_future(_answer_and_cache(feature, key, messages, temperature, progress))
+    _in_flight[key] = task
+    try:
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        # The call runs on to fill the cache, but must stop editing the caller's message
+        if progress is not None:
+            progress.callback = None
+        raise
+
+
+class _Progress:
+    """on_progress wrapper that ask_chatgpt detaches once its caller stops waiting."""
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    async def __call__(self, text):
+        if self.callback is not None:
+            await self.callback(text)
+
+
+async def _answer_and_cache(feature, key, messages, temperature, progress):
+    try:
+        answer = await _ask_chatgpt(messages, temperature, progress)
+    finally:
+        _in_flight.pop(key, None)
+    if answer != AI_ERROR_MESSAGE:
+        await cache.set(feature, key, answer)
+    return answer
+
+
+def stats():
+    return {'active_calls': _active_calls, 'max_concurrency': _max_concurrency}
+
+
+metrics.collect('lawbot_openai_active_calls', 'OpenAI requests in flight.', lambda: _active_calls)
+metrics.collect('lawbot_openai_max_concurrency', 'Cap on concurrent OpenAI requests.', lambda: _max_concurrency)
+
+
+@asynccontextmanager
+async def _slot():
+    """One of the AI_MAX_CONCURRENCY slots for an OpenAI request."""
+    global _active_calls
+    async with _semaphore:
+        _active_calls += 1
+        try:
+            yield
+        finally:
+            _active_calls -= 1
+
+
+async def _ask_chatgpt(messages, temperature, on_progress=None):
+    try:
+        async with _slot():
+            if on_progress is not None:
+                with metrics.timer('openai.chat_stream'):
+                    return await asyncio.wait_for(_stream_chatgpt(messages, temperature, on_progress), timeout=AI_TIMEOUT)
+            with metrics.timer('openai.chat'):
+                response = await asyncio.wait_for(
+                    get_client().chat.completions.create(
+                        model=AI_MODEL,
+                        messages=messages,
+                        temperature=temperature
+                    ),
+                    timeout=AI_TIMEOUT
+                )
+        metrics.record_usage(AI_MODEL, getattr(response, 'usage', None))
+        return response.choices[0].message.content
+    except asyncio.TimeoutError:
+        print(f"OpenAI Timeout: no answer after {AI_TIMEOUT}s")
+        return AI_ERROR_MESSAGE
+    except Exception as e:
+        print(f"OpenAI Error: {e}")
+        return AI_ERROR_MESSAGE
+
+
+async def _stream_chatgpt(messages, temperature, on_progress):
+    stream = await get_client().chat.completions.create(
+        model=AI_MODEL,
+        messages=messages,
+        temperature=temperature,
+        stream=True,
+        stream_options={'include_usage': True}
+    )
+    text = ""
+    async for chunk in stream:
+        # The last chunk carries only the token usage
+        metrics.record_usage(AI_MODEL, getattr(chunk, 'usage', None))
+        if chunk.choices and chunk.choices[0].delta.content:
+            text += chunk.choices[0].delta.content
+            await on_progress(text)
+    return text
+
+
+async def create_embeddings(model, texts):
+    """Embed texts under the same concurrency cap, timeout and metrics as chat calls.
+    Errors propagate: callers decide between failing an import and skipping a search."""
+    async with _slot():
+        with metrics.timer('openai.embeddings'):
+            response = await asyncio.wait_for(
+                get_client().embeddings.create(model=model, input=list(texts)),
+                timeout=AI_TIMEOUT
+            )
+    metrics.record_usage(model, getattr(response, 'usage', None))
+    return response
+
+
+async def transcribe_audio(audio, filename="voice.ogg"):
+    """Transcribe an in-memory audio file (bytes or a file-like object)."""
+    try:
+        async with _slot():
+            with metrics.timer('openai.whisper'):
+                transcript = await asyncio.wait_for(
+                    get_client().audio.transcriptions.create(
+                        model="whisper-1",
+                        file=(filename, audio),
+                        language="km"
+                    ),
+                    timeout=AI_TIMEOUT
+                )
+        return transcript.text
+    except asyncio.TimeoutError:
+        print(f"Whisper Timeout: no answer after {AI_TIMEOUT}s")
+        return None
+    except Exception as e:
+        print(f"Whisper Error: {e}")
+        return None
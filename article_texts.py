@@ -0,0 +1,147 @@
+"""Article explanations and translations generated ahead of time.
+
+Rows in law_article_texts are keyed by (article_id, kind) and remember the hash of
+the article text they were generated from, so an edited article simply stops matching
+and is regenerated on the next batch run. The bot reads them with `get`; on a miss it
+generates live and stores the answer with `store`.
+
+Batch run (resumable: finished rows are skipped on the next run):
+
+    python article_texts.py --kinds explain_km,translate_en --concurrency 8
+"""
+import argparse
+import asyncio
+import hashlib
+import time
+from collections import Counter
+
+import ai_client
+import db
+import metrics
+from ai_client import AI_ERROR_MESSAGE, ask_chatgpt
+from snapshot import law_snapshot
+
+# kind -> (prompt template, temperature, response-cache feature)
+KINDS = {
+    'explain_km': ("Explain this law article in simple Khmer: '{text}'", 0.7, 'explain'),
+    'translate_en': ("Translate the following Cambodian legal text into English. Maintain legal terminology:\n\n'{text}'", 0.3, 'translate'),
+}
+
+outcomes = Counter()
+
+
+def article_text(title, content):
+    return f"{title}\n{content}"
+
+
+def text_hash(title, content):
+    return hashlib.sha256(article_text(title, content).encode('utf-8')).hexdigest()
+
+
+async def generate(kind, title, content, on_progress=None):
+    """Ask the model for one kind of text; the same prompt is used live and in batch."""
+    template, temperature, feature = KINDS[kind]
+    prompt = template.format(text=article_text(title, content))
+    return await ask_chatgpt([{"role": "user", "content": prompt}], temperature=temperature,
+                             feature=feature, on_progress=on_progress)
+
+
+async def get(article_id, kind, title, content):
+    """The stored text for this version of the article, or None. The snapshot
+    (LAW_SOURCE=snapshot) is read first; texts generated since its export are in the DB."""
+    content_hash = text_hash(title, content)
+    text = None
+    if law_snapshot is not None and law_snapshot.loaded:
+        text = law_snapshot.article_text(int(article_id), kind, content_hash)
+    if text is None and db.available():
+        try:
+            row = await db.fetchrow(
+                "SELECT text FROM law_article_texts WHERE article_id = $1 AND kind = $2 AND content_hash = $3",
+                int(article_id), kind, content_hash
+            )
+            text = row[0] if row else None
+        except Exception as e:
+            print(f"DB Error: {e}")
+    outcomes['hit' if text else 'miss'] += 1
+    return text
+
+
+async def store(article_id, kind, title, content, text):
+    if not db.available():
+        return
+    try:
+        await _upsert(int(article_id), kind, text_hash(title, content), text)
+    except Exception as e:
+        print(f"DB Error: {e}")
+
+
+async def _upsert(article_id, kind, content_hash, text):
+    async with db.acquire() as conn:
+        await conn.execute("""
+            INSERT INTO law_article_texts (article_id, kind, content_hash, text, model)
+            VALUES ($1, $2, $3, $4, $5)
+            ON CONFLICT (article_id, kind) DO UPDATE SET
+                content_hash = EXCLUDED.content_hash, text = EXCLUDED.text,
+                model = EXCLUDED.model, created_at = now()
+        """, article_id, kind, content_hash, text, ai_client.AI_MODEL)
+
+
+async def pending(kind, limit=None):
+    """(id, title, content, hash) for articles with no text of this kind, or a stale one."""
+    rows = await db.fetch("SELECT id, article_title, content FROM law_articles ORDER BY id")
+    done = dict(await db.fetch("SELECT article_id, content_hash FROM law_article_texts WHERE kind = $1", kind))
+    todo = []
+    for art_id, title, content in rows:
+        content_hash = text_hash(title, content)
+        if done.get(art_id) != content_hash:
+            todo.append((art_id, title, content, content_hash))
+    return todo[:limit] if limit else todo
+
+
+async def precompute(kinds, concurrency, limit=None):
+    ai_client.configure(max_concurrency=concurrency)
+    await db.init_pool()
+    try:
+        for kind in kinds:
+            todo = await pending(kind, limit)
+            print(f"🚀 {kind}: {len(todo)} មាត្រា ត្រូវបង្កើត")
+            queue = list(reversed(todo))
+            counts = Counter()
+            start = time.perf_counter()
+
+            async def worker():
+                while queue:
+                    art_id, title, content, content_hash = queue.pop()
+                    text = await generate(kind, title, content)
+                    if text == AI_ERROR_MESSAGE:
+                        # Left for the next run
+                        counts['failed'] += 1
+                        continue
+                    await _upsert(art_id, kind, content_hash, text)
+                    counts['saved'] += 1
+                    if counts['saved'] % 50 == 0:
+                        elapsed = time.perf_counter() - start
+                        print(f"    -> {counts['saved']}/{len(todo)} ({counts['saved'] / elapsed:.1f}/s), {counts['failed']} failed")
+
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            print(f"✅ {kind}: {counts['saved']} saved, {counts['failed']} failed "
+                  f"in {time.perf_counter() - start:.1f}s")
+    finally:
+        await db.close_pool()
+
+
+metrics.collect('lawbot_article_texts_total', 'Stored explanation/translation reads by outcome.',
+                lambda: outcomes, kind='counter', label='outcome')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate article explanations and translations in batch")
+    parser.add_argument("--kinds", default="explain_km", help=f"comma separated, from {', '.join(KINDS)}")
+    parser.add_argument("--concurrency", type=int, default=ai_client.AI_MAX_CONCURRENCY)
+    parser.add_argument("--limit", type=int, help="stop after this many articles per kind")
+    args = parser.parse_args()
+    kinds = args.kinds.split(',')
+    unknown = [k for k in kinds if k not in KINDS]
+    if unknown:
+        parser.error(f"unknown kind: {', '.join(unknown)}")
+    asyncio.run(precompute(kinds, args.concurrency, args.limit))
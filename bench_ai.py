@@ -0,0 +1,47 @@
+"""Load test for the AI layer: answers/sec against number of concurrent chats.
+
+Uses a fake OpenAI client, so no API key or network is needed:
+
+    python bench_ai.py --latency 0.5 --chats 1 5 10 20 --concurrency 10
+"""
+import argparse
+import asyncio
+import time
+
+import ai_client
+from fake_backends import FakeOpenAI
+
+
+async def run_blocking(chats, latency):
+    # Old behaviour: a sync call inside the handler blocks the loop
+    async def chat():
+        time.sleep(latency)
+    start = time.perf_counter()
+    await asyncio.gather(*(chat() for _ in range(chats)))
+    return time.perf_counter() - start
+
+
+async def run_async(chats):
+    async def chat():
+        await ai_client.ask_chatgpt([{"role": "user", "content": "សំណួរ"}])
+    start = time.perf_counter()
+    await asyncio.gather(*(chat() for _ in range(chats)))
+    return time.perf_counter() - start
+
+
+async def main(args):
+    ai_client.configure(client=FakeOpenAI(args.latency), max_concurrency=args.concurrency)
+    print(f"latency={args.latency}s  concurrency cap={args.concurrency}")
+    print(f"{'chats':>6} {'blocking (ans/s)':>18} {'async (ans/s)':>15}")
+    for chats in args.chats:
+        blocking = await run_blocking(chats, args.latency)
+        non_blocking = await run_async(chats)
+        print(f"{chats:>6} {chats / blocking:>18.2f} {chats / non_blocking:>15.2f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.5)
+    parser.add_argument('--concurrency', type=int, default=ai_client.AI_MAX_CONCURRENCY)
+    parser.add_argument('--chats', type=int, nargs='+', default=[1, 5, 10, 20])
+    asyncio.run(main(parser.parse_args()))
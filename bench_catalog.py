@@ -0,0 +1,74 @@
+"""Navigation callback latency with and without the in-memory law catalog.
+
+The database is fake_backends.FakePool with a fixed round-trip latency, so no Postgres
+is needed:
+
+    python bench_catalog.py --db-latency 0.02 --rounds 50
+"""
+import argparse
+import asyncio
+import random
+import time
+from types import SimpleNamespace
+
+import callbacks
+import db
+import main
+from fake_backends import FakePool, make_corpus
+from law_catalog import catalog
+
+
+class FakeQuery:
+    def __init__(self, data):
+        self.data = data
+        self.message = SimpleNamespace(reply_text=self._noop, delete=self._noop)
+
+    async def _noop(self, *args, **kwargs):
+        pass
+
+    async def answer(self):
+        pass
+
+    async def edit_message_text(self, *args, **kwargs):
+        pass
+
+
+async def time_callback(data):
+    update = SimpleNamespace(update_id=0, callback_query=FakeQuery(data), effective_chat=SimpleNamespace(id=1),
+                             effective_user=SimpleNamespace(id=1))
+    context = SimpleNamespace(user_data={})
+    start = time.perf_counter()
+    await main.handle_navigation(update, context)
+    return time.perf_counter() - start
+
+
+async def run(rows, rounds):
+    timings = {'code': [], 'section': [], 'article': []}
+    for _ in range(rounds):
+        art_id, code, section = random.choice(rows)[:3]
+        section_id = min(r[0] for r in rows if r[1] == code and r[2] == section)
+        timings['code'].append(await time_callback(callbacks.encode('code', code)))
+        timings['section'].append(await time_callback(callbacks.encode('section', section_id)))
+        timings['article'].append(await time_callback(callbacks.encode('article', art_id)))
+    return {k: sum(v) / len(v) * 1000 for k, v in timings.items()}
+
+
+async def bench(args):
+    rows = make_corpus(sections=args.sections, articles=args.articles)
+    db._pool = FakePool(rows, latency=args.db_latency, sigma=0)
+    without = await run(rows, args.rounds)
+    await catalog.refresh()
+    with_cache = await run(rows, args.rounds)
+    print(f"db latency={args.db_latency * 1000:.0f}ms  articles={len(rows)}  rounds={args.rounds}")
+    print(f"{'callback':>9} {'no cache (ms)':>14} {'catalog (ms)':>13}")
+    for key in without:
+        print(f"{key:>9} {without[key]:>14.3f} {with_cache[key]:>13.3f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db-latency', type=float, default=0.02)
+    parser.add_argument('--rounds', type=int, default=50)
+    parser.add_argument('--sections', type=int, default=20, help="sections per law code")
+    parser.add_argument('--articles', type=int, default=30, help="articles per section")
+    asyncio.run(bench(parser.parse_args()))
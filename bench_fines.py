@@ -0,0 +1,91 @@
+"""Latency and match rate of the traffic-fine table over sample violation phrasings.
+
+    python bench_fines.py --repeat 1000
+    python bench_fines.py --check      # exit 1 if any sample is matched wrongly
+"""
+import argparse
+import sys
+import time
+
+from traffic_fines import schedule
+
+# (phrasing, expected violation code or None when the LLM should take over[, expected vehicle])
+SAMPLES = [
+    ("អត់ពាក់មួក", "NO_HELMET"),
+    ("ខ្ញុំជិះម៉ូតូមិនពាក់មួកសុវត្ថិភាព", "NO_HELMET"),
+    ("គ្មាន មួក", "NO_HELMET"),
+    ("no helmet on my moto", "NO_HELMET"),
+    ("ជិះបញ្ច្រាស", "WRONG_WAY"),
+    ("បើកឡានច្រាសផ្លូវ", "WRONG_WAY"),
+    ("បើកបុកភ្លើងក្រហម", "RED_LIGHT"),
+    ("ran a red light in my car", "RED_LIGHT"),
+    ("ជិះលឿនពេក", "SPEEDING"),
+    ("បើករថយន្តលើសល្បឿន", "SPEEDING"),
+    ("អត់មានប័ណ្ណបើកបរ", "NO_LICENSE"),
+    ("driving without a license", "NO_LICENSE"),
+    ("ម៉ូតូអត់កញ្ចក់", "NO_MIRROR"),
+    ("លេងទូរស័ព្ទពេលបើកបរ", "PHONE"),
+    ("using phone while driving", "PHONE"),
+    ("មិនពាក់ខ្សែក្រវ៉ាត់", "NO_SEATBELT"),
+    ("forgot my seat belt", "NO_SEATBELT"),
+    ("បើកបរស្រវឹង", "DRUNK"),
+    ("ផឹកស្រាហើយជិះម៉ូតូ", "DRUNK"),
+    ("ម៉ូតូអត់ស្លាកលេខ", "NO_PLATE"),
+    ("ជិះបីនាក់", "OVERLOAD"),
+    ("ដឹកលើសចំណុះ", "OVERLOAD"),
+    ("ជិះយប់អត់ភ្លើង", "NO_LIGHTS"),
+    ("ចតខុសកន្លែង", "ILLEGAL_PARKING"),
+    ("illegal parking", "ILLEGAL_PARKING"),
+    ("ឈ្លោះគ្នាតាមផ្លូវ", None),
+    ("បុកគេរត់", None),
+    # Latin keywords match whole words only: no "car" in "carrying" or "scared"
+    ("carrying goods on a motorbike with no helmet", "NO_HELMET", "motorbike"),
+    ("I was scared and drove without a license", "NO_LICENSE", None),
+    # Wearing the helmet / seatbelt is compliance, not the violation
+    ("ខ្ញុំពាក់មួកហើយ តែជិះលឿន", "SPEEDING"),
+    ("ខ្ញុំពាក់មួកសុវត្ថិភាពហើយ តែជិះលឿន", "SPEEDING"),
+    ("ពាក់ខ្សែក្រវ៉ាត់ហើយ តែបើកលឿន", "SPEEDING"),
+    ("ខ្ញុំមិនបានពាក់មួកសុវត្ថិភាពទេ", "NO_HELMET"),
+    ("បើកឡានមិនពាក់ខ្សែក្រវ៉ាត់", "NO_SEATBELT", "car"),
+]
+
+
+def main(args):
+    matched = correct = 0
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for text, *_ in SAMPLES:
+            schedule.calculate(text)
+    elapsed = time.perf_counter() - start
+
+    wrong = []
+    for text, expected, *vehicle in SAMPLES:
+        codes, found_vehicle = schedule.match(text)
+        if codes:
+            matched += 1
+        # Exactly the expected violation (a false extra one would add to the fine), and the vehicle if given
+        if codes == ([expected] if expected else []) and vehicle in ([], [found_vehicle]):
+            correct += 1
+        else:
+            wrong.append((text, codes, found_vehicle))
+        if args.verbose:
+            print(f"{text:<40} -> {codes} {found_vehicle}")
+
+    lookups = args.repeat * len(SAMPLES)
+    print(f"samples={len(SAMPLES)}  lookups={lookups}")
+    print(f"mean latency: {elapsed / lookups * 1e6:.1f} µs")
+    print(f"match rate:   {matched / len(SAMPLES):.0%} (rest fall back to the LLM)")
+    print(f"accuracy:     {correct / len(SAMPLES):.0%}")
+    for text, codes, vehicle in wrong:
+        print(f"  wrong: {text!r} -> {codes} {vehicle}")
+    return not wrong
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=1000)
+    parser.add_argument('--verbose', action='store_true')
+    parser.add_argument('--check', action='store_true', help="exit 1 if any sample is matched wrongly")
+    args = parser.parse_args()
+    if not main(args) and args.check:
+        sys.exit(1)
@@ -0,0 +1,113 @@
+"""Fuzz and time formatter.render(): every chunk must be HTML the Bot API accepts.
+
+Random mixes of Khmer text, Markdown markers, HTML tags and stray <, > and & are rendered,
+then every chunk is checked by a strict re-implementation of Telegram's HTML rules:
+only supported tags, proper nesting, nothing inside <code>/<pre>, known entities,
+at most 4096 UTF-16 units, not blank. Khmer characters must survive in order.
+
+    python bench_formatter.py --cases 20000 --seed 1
+"""
+import argparse
+import random
+import re
+import time
+
+import formatter
+
+PIECES = [
+    'ច្បាប់', 'មាត្រា ១២', 'ពិន័យ', 'អ្នកបើកបរ', ' ', ' ', ' ', '\n', '\n\n', '*', '**', '`', '```', '```python\n',
+    '# ', '## ', '- ', '* ', '<b>', '</b>', '<i>', '</i>', '<code>', '</code>', '<pre>', '</pre>',
+    '<strong>', '</em>', "<a href='https://example.com/?a=1&b=2'>", '</a>', "<a href='javascript:x'>",
+    '<script>', '<', '>', '&', '&amp;', '"', "'", '_', '[', ']', '(', ')', '😀', '🇰🇭', 'abc', '123',
+]
+ALLOWED = {'b', 'i', 'u', 's', 'code', 'pre', 'a'}
+ENTITIES = {'lt', 'gt', 'amp', 'quot'}
+_PIECE = re.compile(r'<(/?)([a-z]*)([^<>]*)>|&([a-z]*);|[<>&]|[^<>&]+')
+_KHMER = re.compile(r'[ក-៿]')
+
+
+def check(html):
+    """Return None if Telegram would accept `html` as a message, else the reason."""
+    stack, units = [], 0
+    for m in _PIECE.finditer(html):
+        piece = m.group()
+        if m.group(2) is not None:
+            closing, name, attrs = m.groups()[:3]
+            if name not in ALLOWED:
+                return f"unsupported tag {piece!r}"
+            if closing:
+                if not stack or stack[-1] != name:
+                    return f"misnested {piece!r} in {stack}"
+                stack.pop()
+                continue
+            if name == 'a' and not re.fullmatch(r' href="(?:https?|tg)://[^"]+"', attrs):
+                return f"bad link {piece!r}"
+            if name != 'a' and attrs:
+                return f"attributes on {piece!r}"
+            if name in stack:
+                return f"nested <{name}>"
+            if stack and stack[-1] in ('code', 'pre'):
+                return f"{piece!r} inside <{stack[-1]}>"
+            stack.append(name)
+        elif m.group(4) is not None:
+            if m.group(4) not in ENTITIES:
+                return f"unknown entity {piece!r}"
+            units += 1
+        elif piece in '<>&':
+            return f"unescaped {piece!r}"
+        else:
+            units += formatter._units(piece)
+    if stack:
+        return f"unclosed {stack}"
+    if units > formatter.MAX_MESSAGE_LENGTH:
+        return f"too long: {units} units"
+    if not re.sub(r'<[^>]+>', '', html).strip():
+        return "blank message"
+    return None
+
+
+def fuzz(args):
+    rng = random.Random(args.seed)
+    failures = chunks = 0
+    for case in range(args.cases):
+        size = rng.choice((5, 50, 500, 3000))
+        text = ''.join(rng.choice(PIECES) for _ in range(size))
+        rendered = formatter.render(text)
+        chunks += len(rendered)
+        problems = [p for p in map(check, rendered) if p]
+        if ''.join(_KHMER.findall(text)) != ''.join(_KHMER.findall(''.join(rendered))):
+            problems.append("Khmer text lost or reordered")
+        if problems:
+            failures += 1
+            if failures <= 5:
+                print(f"case {case}: {problems[0]}\n  input: {text[:200]!r}")
+    print(f"fuzz: {args.cases} cases, {chunks} messages, {failures} rejected")
+    return failures
+
+
+def bench(args):
+    paragraph = (
+        "## មាត្រា ១២\n**អ្នកបើកបរ** ដែលមិនពាក់មួកសុវត្ថិភាព ត្រូវផាកពិន័យ *៤០,០០០ រៀល*។\n"
+        "- ចំណុចទី១ <i>បន្ថែម</i> & `code`\n- ចំណុចទី២ (a < b)\n\n"
+    )
+    print(f"{'chars':>8} {'messages':>9} {'us/render':>10}")
+    for size in args.sizes:
+        text = (paragraph * (size // len(paragraph) + 1))[:size]
+        rounds = max(1, args.rounds * 1000 // size)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            rendered = formatter.render(text)
+        elapsed = (time.perf_counter() - start) / rounds
+        print(f"{size:>8} {len(rendered):>9} {elapsed * 1e6:>10.0f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cases', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[500, 4000, 20000])
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args()
+    failed = fuzz(args)
+    bench(args)
+    raise SystemExit(1 if failed else 0)
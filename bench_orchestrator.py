@@ -0,0 +1,110 @@
+"""Question latency: the old sequential lookup chain vs orchestrator.QueryOrchestrator.
+
+Backends are stubs with randomised latencies, so no DB, DDGS or OpenAI is needed.
+A question is a confident keyword hit, a semantic hit, or goes to the web:
+
+    python bench_orchestrator.py --questions 400 --scale 0.1
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from orchestrator import QueryOrchestrator
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+class Stubs:
+    """Latencies in seconds (before --scale) loosely follow production: BM25 in memory,
+    one embedding call, a DDGS round trip with a long tail, and the chat completion."""
+
+    def __init__(self, rng, scale):
+        self.rng = rng
+        self.scale = scale
+
+    async def sleep(self, median, sigma=0.5):
+        await asyncio.sleep(self.rng.lognormvariate(0, sigma) * median * self.scale)
+
+    async def keyword_search(self, question):
+        await self.sleep(0.002)
+        return [(1, 'មាត្រា ១', '...', 0.9)] if question == 'article' else []
+
+    async def semantic_search(self, question):
+        await self.sleep(0.3)
+        return [(1, 'មាត្រា ១', 'traffic', '...', 0.8)] if question == 'rag' else []
+
+    async def web_search(self, question):
+        await self.sleep(1.5, sigma=0.9)
+        return [{'body': '...'}]
+
+    async def answer(self, question, context, on_progress=None):
+        await self.sleep(2.0, sigma=0.4)
+        return 'ចម្លើយ'
+
+
+async def sequential(stubs, question):
+    # Before: keyword search, then on a miss semantic search, then on a miss web search, then the LLM
+    if await stubs.keyword_search(question):
+        return
+    chunks = await stubs.semantic_search(question)
+    if chunks:
+        await stubs.answer(question, chunks)
+        return
+    await stubs.answer(question, await stubs.web_search(question))
+
+
+async def measure(run, questions, concurrency):
+    latencies = []
+    queue = list(questions)
+
+    async def worker():
+        while queue:
+            question = queue.pop()
+            start = time.perf_counter()
+            await run(question)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+
+async def bench(args):
+    rng = random.Random(args.seed)
+    kinds = ['article'] * args.article + ['rag'] * args.rag + ['web'] * args.web
+    questions = [rng.choice(kinds) for _ in range(args.questions)]
+    stubs = Stubs(rng, args.scale)
+    orchestrator = QueryOrchestrator(stubs.keyword_search, stubs.semantic_search, stubs.web_search,
+                                     stubs.answer, stubs.answer,
+                                     deadline=args.deadline * args.scale, web_timeout=args.web_timeout * args.scale)
+    partial = 0
+
+    async def orchestrated(question):
+        nonlocal partial
+        partial += (await orchestrator.run(question)).partial
+
+    print(f"{args.questions} questions ({args.article}/{args.rag}/{args.web} article/rag/web mix), "
+          f"times scaled x{args.scale}, reported unscaled")
+    print(f"{'':>14} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} {'max s':>7}")
+    for name, run in (('sequential', lambda q: sequential(stubs, q)), ('orchestrator', orchestrated)):
+        latencies = [t / args.scale for t in await measure(run, questions, args.concurrency)]
+        print(f"{name:>14} {percentile(latencies, 50):>7.2f} {percentile(latencies, 95):>7.2f} "
+              f"{percentile(latencies, 99):>7.2f} {max(latencies):>7.2f}")
+    print(f"partial answers past the {args.deadline:.0f}s deadline: {partial}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--questions', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--scale', type=float, default=0.1, help="multiply every latency to run faster")
+    parser.add_argument('--deadline', type=float, default=8.0)
+    parser.add_argument('--web-timeout', type=float, default=3.0)
+    parser.add_argument('--article', type=int, default=3, help="relative share of confident keyword hits")
+    parser.add_argument('--rag', type=int, default=3)
+    parser.add_argument('--web', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=1)
+    asyncio.run(bench(parser.parse_args()))
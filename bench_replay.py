@@ -0,0 +1,307 @@
+"""End-to-end replay: Telegram updates through the real handlers, with every backend faked.
+
+Telegram (fake_telegram), OpenAI and Postgres (fake_backends) and DDGS
+(websearch.FixtureBackend) answer locally after configurable latencies, so no token,
+key, database or network is needed. Updates are a synthetic text/callback/voice/photo
+mix, or raw Telegram updates replayed from a JSONL file, sent open-loop at --rate/s:
+
+    python bench_replay.py --updates 2000 --rate 100
+    python bench_replay.py --record updates.jsonl            # keep the synthetic stream
+    python bench_replay.py --updates-file updates.jsonl --save baseline.json
+    python bench_replay.py --updates-file updates.jsonl --baseline baseline.json
+
+With --baseline the run fails (exit 1) when throughput or any handler's p95 is worse
+than the saved run by more than --tolerance.
+"""
+import os
+
+# Read by the bot's modules at import: keep jobs and the snippet cache in memory,
+# and embed locally
+os.environ.update({
+    'JOB_QUEUE_DB': ':memory:',
+    'WEB_SEARCH_CACHE_DB': ':memory:',
+    'EMBEDDING_BACKEND': 'hash',
+})
+
+import argparse
+import asyncio
+import io
+import json
+import random
+import sys
+import time
+from collections import defaultdict
+
+from telegram import Update
+
+import admission
+import ai_client
+import callbacks
+import db
+import jobs
+import main
+import metrics
+import websearch
+from article_texts import text_hash
+from fake_backends import VOCABULARY, FakeOpenAI, FakePool, make_corpus
+from fake_telegram import FakeTelegram, callback_update, photo_update, text_update, voice_update
+from law_catalog import catalog
+from semantic_search import HashEmbedder, embed_articles
+
+MIX = {'text': 45, 'callback': 40, 'voice': 5, 'photo': 5, 'start': 5}
+UNKNOWN_QUESTIONS = ["តើខ្ញុំគួរធ្វើដូចម្តេច", "សួរអំពីពន្ធលើរបរ", "ការចុះបញ្ជីអាជីវកម្ម", "ទិដ្ឋាការធ្វើការ"]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def jpeg_bytes(width=1280, height=960):
+    from PIL import Image
+    out = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 180, 160)).save(out, format='JPEG')
+    return out.getvalue()
+
+
+# --- UPDATES ---
+
+def synthetic_updates(rows, count, users, rng):
+    """Raw update dicts in the given MIX; questions hit articles, partly match, or miss the corpus."""
+    kinds = [k for k, weight in MIX.items() for _ in range(weight)]
+    sections = sorted({(r[1], r[2]): r[0] for r in reversed(rows)}.values())
+    updates = []
+    for _ in range(count):
+        user = rng.randrange(1, users + 1)
+        kind = rng.choice(kinds)
+        if kind == 'text':
+            article = rng.choice(rows)
+            question = rng.choice([
+                article[3].split(': ')[1],                      # an article's topic: keyword hit
+                " ".join(rng.sample(VOCABULARY, 3)),            # loosely related: semantic or web
+                rng.choice(UNKNOWN_QUESTIONS),                  # not in the corpus: web
+            ])
+            updates.append(text_update(user, question))
+        elif kind == 'callback':
+            article = rng.choice(rows)
+            data = rng.choice([
+                callbacks.encode('code', article[1]),
+                callbacks.encode('section', rng.choice(sections)),
+                callbacks.encode('article', article[0]),
+                callbacks.encode('article', article[0]),
+                callbacks.encode('explain', article[0]),
+                'main',
+            ])
+            updates.append(callback_update(user, data))
+        elif kind == 'voice':
+            updates.append(voice_update(user, 'voice', 32 * 1024))
+        elif kind == 'photo':
+            updates.append(photo_update(user, 'photo', 200 * 1024))
+        else:
+            updates.append(text_update(user, '/start'))
+    return updates
+
+
+def classify(update):
+    """Handler label for an update, e.g. 'text', 'voice', 'callback.article'."""
+    if 'callback_query' in update:
+        data = update['callback_query'].get('data', '')
+        nav = callbacks.decode(data)
+        return f"callback.{nav[0] if nav else data.split('_')[0]}"
+    message = update.get('message') or {}
+    for kind in ('voice', 'photo', 'location'):
+        if kind in message:
+            return kind
+    return 'command' if message.get('text', '').startswith('/') else 'text'
+
+
+# --- RUN ---
+
+class Sampler:
+    """Every `interval`: event-loop lag, DB connections in use, OpenAI slots in use."""
+
+    def __init__(self, pool, interval=0.01):
+        self.pool = pool
+        self.interval = interval
+        self.lag, self.pool_used, self.ai_used = [], [], []
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lag.append(loop.time() - start - self.interval)
+            self.pool_used.append(self.pool.in_use / self.pool.max_size)
+            stats = ai_client.stats()
+            self.ai_used.append(stats['active_calls'] / stats['max_concurrency'])
+
+
+async def install_fakes(args, rows, rng):
+    embeddings = await embed_articles(HashEmbedder(), [(r[0], r[4]) for r in rows])
+    pool = FakePool(rows, embeddings, latency=args.db_latency, max_size=db.DB_POOL_MAX)
+    # Stored explanations for a share of the articles; the rest are generated live
+    for r in rows:
+        if rng.random() < args.precomputed:
+            pool.texts[r[0], 'explain_km'] = (text_hash(r[3], r[4]), "ការពន្យល់ដែលបានរៀបចំទុក")
+    db._pool = pool
+
+    async def listen(dsn):
+        pass
+
+    catalog.listen = listen
+    openai = FakeOpenAI(args.openai_latency, sigma=0.3, rng=random.Random(args.seed))
+    ai_client.configure(client=openai)
+    websearch.searcher = websearch.WebSearch(
+        backend=websearch.FixtureBackend(latency=args.web_latency),
+        cache=websearch.SnippetCache(':memory:'),
+    )
+    return pool, openai
+
+
+async def replay(args, updates):
+    rng = random.Random(args.seed)
+    rows = make_corpus(sections=args.sections, articles=args.articles)
+    pool, openai = await install_fakes(args, rows, rng)
+    fake = FakeTelegram(latency=args.telegram_latency, files={'voice': b'OggS' + bytes(32 * 1024), 'photo': jpeg_bytes()})
+
+    latencies = defaultdict(list)
+
+    def timed_job(kind, fn):
+        async def run(bot, job):
+            await fn(bot, job)
+            # From enqueue (deadline minus the kind's budget) to the answer
+            latencies[f"job.{kind}"].append(time.time() - (job.deadline - jobs.JOB_DEADLINES[kind]))
+        return run
+
+    for kind, fn in list(main.JOB_HANDLERS.items()):
+        main.JOB_HANDLERS[kind] = timed_job(kind, fn)
+
+    application = main.build_application(token='123:BENCH', request=fake)
+    await application.initialize()
+    await application.post_init(application)
+    await application.start()
+
+    sampler = Sampler(pool)
+    sampling = asyncio.create_task(sampler.run())
+
+    async def handle(raw):
+        update = Update.de_json(raw, application.bot)
+        start = time.perf_counter()
+        await application.update_processor.process_update(update, application.process_update(update))
+        latencies[classify(raw)].append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    tasks = []
+    due = start
+    for raw in updates:
+        due += rng.expovariate(args.rate)
+        await asyncio.sleep(max(0.0, due - time.perf_counter()))
+        tasks.append(asyncio.create_task(handle(raw)))
+    await asyncio.gather(*tasks)
+    handled = time.perf_counter() - start
+    while jobs.queue.depth() and time.perf_counter() - start < handled + args.job_timeout:
+        await asyncio.sleep(0.05)
+    drained = time.perf_counter() - start
+
+    sampling.cancel()
+    await application.stop()
+    await application.post_shutdown(application)
+    await application.shutdown()
+
+    return {
+        'updates': len(updates),
+        'throughput': len(updates) / handled,
+        'handled_s': handled,
+        'drained_s': drained,
+        'handlers': {
+            kind: {'n': len(v), 'p50': percentile(v, 50) * 1000, 'p95': percentile(v, 95) * 1000,
+                   'p99': percentile(v, 99) * 1000, 'max': max(v) * 1000}
+            for kind, v in sorted(latencies.items())
+        },
+        'routes': {route[0]: n for route, n in metrics.query_routes._values.items()},
+        'jobs': dict(jobs.queue.outcomes),
+        'admission': {k: sum(v.values()) for k, v in admission.controller.stats().items() if isinstance(v, dict)},
+        'pool': {'mean': sum(sampler.pool_used) / len(sampler.pool_used), 'peak': max(sampler.pool_used),
+                 'max_size': pool.max_size, 'queries': dict(pool.queries)},
+        'openai': {'mean': sum(sampler.ai_used) / len(sampler.ai_used), 'peak': max(sampler.ai_used),
+                   'calls': dict(openai.calls)},
+        'loop_lag_ms': {'p50': percentile(sampler.lag, 50) * 1000, 'p99': percentile(sampler.lag, 99) * 1000,
+                        'max': max(sampler.lag) * 1000},
+    }
+
+
+def report(args, result):
+    print(f"{result['updates']} updates at {args.rate:g}/s; latencies: telegram {args.telegram_latency * 1000:.0f}ms, "
+          f"openai {args.openai_latency * 1000:.0f}ms, db {args.db_latency * 1000:.0f}ms, web {args.web_latency * 1000:.0f}ms")
+    print(f"throughput: {result['throughput']:.1f} updates/s (all handled in {result['handled_s']:.1f}s, "
+          f"jobs drained at {result['drained_s']:.1f}s)")
+    print(f"\n{'handler':<18} {'n':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for kind, h in result['handlers'].items():
+        print(f"{kind:<18} {h['n']:>6} {h['p50']:>8.1f} {h['p95']:>8.1f} {h['p99']:>8.1f} {h['max']:>8.1f}")
+    pool, ai, lag = result['pool'], result['openai'], result['loop_lag_ms']
+    print(f"\nquery routes: {result['routes']}")
+    print(f"jobs: {result['jobs']}  admission: {result['admission']}")
+    print(f"db pool: mean {pool['mean']:.0%}, peak {pool['peak']:.0%} of {pool['max_size']} connections; queries {pool['queries']}")
+    print(f"openai slots: mean {ai['mean']:.0%}, peak {ai['peak']:.0%}; calls {ai['calls']}")
+    print(f"event loop lag: p50 {lag['p50']:.2f}ms, p99 {lag['p99']:.2f}ms, max {lag['max']:.1f}ms")
+
+
+def regressions(result, baseline, tolerance, min_samples=20):
+    failures = []
+    if result['throughput'] < baseline['throughput'] * (1 - tolerance):
+        failures.append(f"throughput {result['throughput']:.1f}/s < {baseline['throughput']:.1f}/s")
+    for kind, before in baseline['handlers'].items():
+        now = result['handlers'].get(kind)
+        if now and before['n'] >= min_samples and now['p95'] > before['p95'] * (1 + tolerance):
+            failures.append(f"{kind} p95 {now['p95']:.1f}ms > {before['p95']:.1f}ms")
+    return failures
+
+
+def load_updates(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--updates', type=int, default=1000, help="synthetic updates to send")
+    parser.add_argument('--updates-file', help="JSONL of raw Telegram updates to replay instead")
+    parser.add_argument('--record', help="write the synthetic updates to this JSONL file and exit")
+    parser.add_argument('--rate', type=float, default=50, help="mean updates per second (Poisson arrivals)")
+    parser.add_argument('--users', type=int, default=300)
+    parser.add_argument('--sections', type=int, default=20, help="sections per law code")
+    parser.add_argument('--articles', type=int, default=30, help="articles per section")
+    parser.add_argument('--precomputed', type=float, default=0.8, help="share of articles with a stored explanation")
+    parser.add_argument('--telegram-latency', type=float, default=0.03)
+    parser.add_argument('--openai-latency', type=float, default=0.8)
+    parser.add_argument('--db-latency', type=float, default=0.005)
+    parser.add_argument('--web-latency', type=float, default=1.0)
+    parser.add_argument('--job-timeout', type=float, default=60, help="seconds to wait for queued jobs after the last update")
+    parser.add_argument('--save', help="write the results as JSON")
+    parser.add_argument('--baseline', help="compare with results saved by --save")
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.updates_file:
+        updates = load_updates(args.updates_file)
+    else:
+        rows = make_corpus(sections=args.sections, articles=args.articles)
+        updates = synthetic_updates(rows, args.updates, args.users, random.Random(args.seed))
+    if args.record:
+        with open(args.record, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(u, ensure_ascii=False) + "\n" for u in updates)
+        print(f"wrote {len(updates)} updates to {args.record}")
+        sys.exit()
+
+    result = asyncio.run(replay(args, updates))
+    report(args, result)
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            failures = regressions(result, json.load(f), args.tolerance)
+        for failure in failures:
+            print(f"REGRESSION: {failure}")
+        sys.exit(1 if failures else 0)
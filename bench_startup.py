@@ -0,0 +1,133 @@
+"""Cold start: time to `import main`, and from process start to the first reply.
+
+Every run is a fresh interpreter. Telegram is fake_telegram.FakeTelegram and the
+database is fake_backends.FakePool, so no token, network or Postgres is needed.
+The first update opens an article, which is served from the catalog when it was
+preloaded and from the (fake) DB otherwise:
+
+    python bench_startup.py --runs 5 --articles 100 --db-latency 0.02
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+def child_env(preload):
+    env = dict(os.environ)
+    env.update({
+        'PRELOAD_CATALOG': '1' if preload else '0',
+        'JOB_WORKERS': '0',
+        'EMBEDDING_BACKEND': 'hash',
+        'OPENAI_API_KEY': env.get('OPENAI_API_KEY', 'sk-bench'),
+    })
+    return env
+
+
+def spawn(*child_args, env=None):
+    start = time.time()
+    out = subprocess.run([sys.executable, __file__, '--child', *child_args], env=env,
+                         capture_output=True, text=True, check=True).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    if 'replied_at' in result:
+        result['first_reply_ms'] = (result.pop('replied_at') - start) * 1000
+    return result
+
+
+async def first_update(args):
+    start = time.perf_counter()
+    import main
+    import_ms = (time.perf_counter() - start) * 1000
+
+    import callbacks
+    import db
+    from fake_backends import FakePool, make_corpus
+    from fake_telegram import FakeTelegram, callback_update
+    from law_catalog import catalog
+    from telegram import Update
+
+    rows = make_corpus(sections=args.sections, articles=args.articles)
+    pool = FakePool(rows, latency=args.db_latency, sigma=0)
+
+    async def init_pool():
+        await asyncio.sleep(args.db_latency * 5)  # TLS handshake and pool fill
+        db._pool = pool
+        return pool
+
+    async def listen(dsn):
+        pass
+
+    db.init_pool, catalog.listen = init_pool, listen
+
+    fake = FakeTelegram()
+    application = main.build_application(token='123:BENCH', request=fake)
+    await application.initialize()
+    await application.post_init(application)
+    warm_up_ms = (time.perf_counter() - start) * 1000 - import_ms
+    await application.start()
+
+    update = Update.de_json(callback_update(1, callbacks.encode('article', rows[len(rows) // 2][0])), application.bot)
+    await application.process_update(update)
+    await fake.wait_for(1)
+    replied_at = time.time()
+
+    await application.stop()
+    await application.post_shutdown(application)
+    await application.shutdown()
+    print(json.dumps({'import_ms': import_ms, 'warm_up_ms': warm_up_ms, 'replied_at': replied_at}))
+
+
+def child(args):
+    if args.child == 'import':
+        start = time.perf_counter()
+        import main  # noqa: F401
+        print(json.dumps({'import_ms': (time.perf_counter() - start) * 1000}))
+    else:
+        asyncio.run(first_update(args))
+
+
+def slowest_imports(count):
+    """Top-level modules by cumulative import time, from `python -X importtime -c 'import main'`."""
+    err = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'],
+                         capture_output=True, text=True).stderr
+    rows = []
+    for line in err.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[1].strip().isdigit() and parts[2].startswith('   ') and not parts[2].startswith('    '):
+            rows.append((int(parts[1]) / 1000, parts[2].strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def bench(args):
+    imports = [spawn('import')['import_ms'] for _ in range(args.runs)]
+    print(f"import main: median {statistics.median(imports):.0f}ms, min {min(imports):.0f}ms over {args.runs} runs")
+    for ms, name in slowest_imports(args.top):
+        print(f"    {ms:>7.1f}ms  {name}")
+
+    child_args = ['--articles', str(args.articles), '--sections', str(args.sections), '--db-latency', str(args.db_latency)]
+    print(f"\n{args.sections * args.articles * 2} articles, db latency={args.db_latency * 1000:.0f}ms (medians, ms)")
+    print(f"{'PRELOAD_CATALOG':>16} {'import':>7} {'warm-up':>8} {'first reply':>12}")
+    for preload in (True, False):
+        runs = [spawn('first-update', *child_args, env=child_env(preload)) for _ in range(args.runs)]
+        median = {key: statistics.median(r[key] for r in runs) for key in runs[0]}
+        print(f"{int(preload):>16} {median['import_ms']:>7.0f} {median['warm_up_ms']:>8.0f} {median['first_reply_ms']:>12.0f}")
+    print("first reply is measured from process spawn, so it includes interpreter start-up")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=6, help="slowest top-level imports to list")
+    parser.add_argument('--sections', type=int, default=50, help="sections per law code")
+    parser.add_argument('--articles', type=int, default=100, help="articles per section")
+    parser.add_argument('--db-latency', type=float, default=0.02)
+    parser.add_argument('--child', choices=['import', 'first-update'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args)
+    else:
+        bench(args)
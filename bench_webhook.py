@@ -0,0 +1,66 @@
+"""Webhook throughput: POST synthetic updates to the aiohttp server and wait for every reply.
+
+Telegram is replaced by fake_telegram.FakeTelegram, so no token or network is needed:
+
+    python bench_webhook.py --updates 2000 --concurrency 1 10 50 --api-latency 0.05
+"""
+import argparse
+import asyncio
+import time
+
+import aiohttp
+
+import main
+import webhook
+from fake_telegram import FakeTelegram, callback_update, text_update
+
+SECRET = 'bench-secret'
+PORT = 18080
+
+
+async def drive(session, updates, concurrency):
+    queue = list(updates)
+    url = f"http://127.0.0.1:{PORT}{webhook.WEBHOOK_PATH}"
+
+    async def sender():
+        while queue:
+            payload = queue.pop()
+            async with session.post(url, json=payload, headers={webhook.SECRET_HEADER: SECRET}) as resp:
+                assert resp.status == 200, resp.status
+
+    await asyncio.gather(*(sender() for _ in range(concurrency)))
+
+
+async def bench(args):
+    fake = FakeTelegram(latency=args.api_latency)
+    application = main.build_application(token='123:BENCH', request=fake)
+    stop = asyncio.Event()
+    server = asyncio.create_task(webhook.serve(application, SECRET, '127.0.0.1', PORT, run_hooks=False, stop_event=stop))
+    await asyncio.sleep(0.5)
+
+    print(f"Telegram API latency={args.api_latency * 1000:.0f}ms  updates={args.updates}")
+    print(f"{'senders':>8} {'updates/s':>10}")
+    async with aiohttp.ClientSession() as session:
+        for concurrency in args.concurrency:
+            # /start sends one message; the 'main' callback edits one
+            updates = [
+                text_update(i, '/start') if i % 2 else callback_update(i, 'main')
+                for i in range(args.updates)
+            ]
+            done_before = fake.calls['sendMessage'] + fake.calls['editMessageText']
+            start = time.perf_counter()
+            await drive(session, updates, concurrency)
+            await fake.wait_for(done_before + args.updates)
+            elapsed = time.perf_counter() - start
+            print(f"{concurrency:>8} {args.updates / elapsed:>10.0f}")
+
+    stop.set()
+    await server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--api-latency', type=float, default=0.05)
+    asyncio.run(bench(parser.parse_args()))
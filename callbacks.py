@@ -0,0 +1,54 @@
+"""Compact, versioned callback_data for the law navigation keyboards.
+
+    "1s.412.2"  ->  ('section', [412, 2])   version 1, section 412, page 2
+
+Sections and articles are addressed by numeric id: an article by its law_articles id,
+a section by the smallest article id in it. Neither shifts when other sections are
+added or removed, unlike the positional indices of the old `sect|code|index` form.
+Old keyboards still in users' chats are decoded too.
+"""
+VERSION = '1'
+# Telegram rejects callback_data longer than this
+MAX_BYTES = 64
+
+ACTIONS = {
+    'code': 'c',         # law_code, page
+    'section': 's',      # section_id, page
+    'article': 'a',      # article_id
+    'explain': 'e',      # article_id
+    'translate': 't',    # article_id
+}
+_BY_CODE = {v: k for k, v in ACTIONS.items()}
+_LEGACY = {'art': 'article', 'explain': 'explain', 'trans': 'translate'}
+
+
+def encode(action, *args):
+    data = VERSION + ACTIONS[action] + ''.join(f".{a}" for a in args)
+    if len(data.encode('utf-8')) > MAX_BYTES:
+        raise ValueError(f"callback_data too long: {data!r}")
+    return data
+
+
+def _arg(value):
+    return int(value) if value.isdigit() else value
+
+
+def decode(data):
+    """(action, args) for navigation callbacks, None for anything else.
+    Legacy `sect|code|index` decodes to ('section_index', [code, index])."""
+    if data.startswith('code_'):
+        return 'code', [data[5:]]
+    if '|' in data:
+        name, *args = data.split('|')
+        if name == 'sect' and len(args) == 2:
+            return 'section_index', [args[0], _arg(args[1])]
+        if name in _LEGACY and args:
+            return _LEGACY[name], [_arg(args[0])]
+        return None
+    if len(data) < 2 or not data[0].isdigit():
+        return None
+    if data[0] != VERSION or data[1] not in _BY_CODE:
+        # A keyboard from a newer or retired format: the caller shows a fresh menu
+        return 'stale', []
+    args = data[2:].split('.')[1:] if len(data) > 2 else []
+    return _BY_CODE[data[1]], [_arg(a) for a in args]
@@ -0,0 +1,109 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+
+# --- CONFIGURATION ---
+DB_URL = os.getenv('DATABASE_URL')
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', '1'))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', '20'))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '5000'))
+DB_ACQUIRE_TIMEOUT = float(os.getenv('DB_ACQUIRE_TIMEOUT', '2'))
+DB_ACQUIRE_RETRIES = int(os.getenv('DB_ACQUIRE_RETRIES', '3'))
+
+_pool = None
+
+
+async def init_pool():
+    global _pool
+    if _pool is None:
+        # Imported here so processes that never connect don't pay for it
+        import asyncpg
+        # asyncpg prepares each query once per connection and keeps it in the
+        # statement cache, so repeated menu queries skip the parse/plan step.
+        _pool = await asyncpg.create_pool(
+            DB_URL,
+            min_size=DB_POOL_MIN,
+            max_size=DB_POOL_MAX,
+            ssl='require',
+            statement_cache_size=100,
+            server_settings={'statement_timeout': str(DB_STATEMENT_TIMEOUT_MS)},
+        )
+        print("✅ Database pool created successfully")
+    return _pool
+
+
+def available():
+    """Whether init_pool has connected."""
+    return _pool is not None
+
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+@asynccontextmanager
+async def acquire():
+    """Check out a connection, backing off and retrying while the pool is exhausted."""
+    if _pool is None:
+        raise RuntimeError("Database pool is not initialised")
+    delay = 0.1
+    with metrics.timer('db.acquire'):
+        for attempt in range(DB_ACQUIRE_RETRIES + 1):
+            try:
+                conn = await _pool.acquire(timeout=DB_ACQUIRE_TIMEOUT)
+                break
+            except asyncio.TimeoutError:
+                if attempt == DB_ACQUIRE_RETRIES:
+                    raise
+                print(f"DB pool busy, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                delay *= 2
+    try:
+        yield conn
+    finally:
+        await _pool.release(conn)
+
+
+@metrics.timed('db.fetch')
+async def fetch(query, *args):
+    async with acquire() as conn:
+        return await conn.fetch(query, *args)
+
+
+@metrics.timed('db.fetchrow')
+async def fetchrow(query, *args):
+    async with acquire() as conn:
+        return await conn.fetchrow(query, *args)
+
+
+async def health_check():
+    try:
+        async with acquire() as conn:
+            return await conn.fetchval("SELECT 1") == 1
+    except Exception as e:
+        print(f"DB Health Error: {e}")
+        return False
+
+
+def pool_stats():
+    if _pool is None:
+        return {'size': 0, 'idle': 0, 'max': DB_POOL_MAX}
+    return {'size': _pool.get_size(), 'idle': _pool.get_idle_size(), 'max': DB_POOL_MAX}
+
+
+def _pool_connections():
+    s = pool_stats()
+    return {'in_use': s['size'] - s['idle'], 'idle': s['idle']}
+
+
+metrics.collect('lawbot_db_pool_connections', 'Pool connections by state.', _pool_connections, label='state')
+metrics.collect('lawbot_db_pool_max', 'Pool max_size.', lambda: DB_POOL_MAX)
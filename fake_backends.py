@@ -0,0 +1,205 @@
+"""Local stand-ins for OpenAI and Postgres, for benchmarks that must not touch the network.
+
+Latencies are lognormal around the given median (sigma=0 makes them fixed).
+"""
+import asyncio
+import random
+from collections import Counter
+from types import SimpleNamespace
+
+# Words the synthetic corpus and questions are built from
+VOCABULARY = [
+    "អ្នកបើកបរ", "ម៉ូតូ", "រថយន្ត", "មួកសុវត្ថិភាព", "ល្បឿន", "ផ្លូវ", "ពិន័យ", "ប្រាក់",
+    "ប័ណ្ណបើកបរ", "គ្រឿងស្រវឹង", "ភ្លើងស្តុប", "ចំណត", "ថ្មើរជើង", "គ្រោះថ្នាក់", "របួស", "តុលាការ",
+    "ពន្ធនាគារ", "ចោរកម្ម", "ឆបោក", "អំពើហិង្សា", "កុមារ", "គ្រួសារ", "កិច្ចសន្យា", "កម្ចី",
+    "ដីធ្លី", "កម្មសិទ្ធិ", "មរតក", "អាពាហ៍ពិពាហ៍", "ការលែងលះ", "ពាក្យបណ្តឹង", "សាក្សី", "មេធាវី",
+]
+
+
+def make_corpus(codes=('criminal', 'traffic'), sections=20, articles=30, words=60, seed=1):
+    """(id, law_code, section, article_title, content) rows of Khmer-looking articles."""
+    rng = random.Random(seed)
+    rows = []
+    art_id = 1
+    for code in codes:
+        for s in range(sections):
+            section = f"{s + 1:02d}. ជំពូក {s + 1}"
+            for _ in range(articles):
+                topic = rng.sample(VOCABULARY, 2)
+                content = " ".join(topic + rng.choices(VOCABULARY, k=words))
+                rows.append((art_id, code, section, f"មាត្រា {art_id}: {''.join(topic)}", content))
+                art_id += 1
+    return rows
+
+
+class Latency:
+    def __init__(self, median, sigma=0.3, rng=None):
+        self.median = median
+        self.sigma = sigma
+        self.rng = rng or random.Random(0)
+
+    async def sleep(self, scale=1.0):
+        if self.median:
+            await asyncio.sleep(self.median * scale * (self.rng.lognormvariate(0, self.sigma) if self.sigma else 1.0))
+
+
+# --- OPENAI ---
+
+class _Stream:
+    def __init__(self, latency, text, chunks):
+        self.latency = latency
+        self.pieces = [text[len(text) * i // chunks:len(text) * (i + 1) // chunks] for i in range(chunks)]
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        for piece in self.pieces:
+            await self.latency.sleep(1 / len(self.pieces))
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))], usage=None)
+        yield SimpleNamespace(choices=[], usage=SimpleNamespace(prompt_tokens=200, completion_tokens=150))
+
+
+class FakeCompletions:
+    def __init__(self, client):
+        self.client = client
+
+    async def create(self, stream=False, **kwargs):
+        self.client.calls['chat'] += 1
+        if stream:
+            # The first token arrives quickly; the rest of the latency is spread over the chunks
+            await self.client.latency.sleep(0.1)
+            return _Stream(self.client.latency, self.client.answer, self.client.stream_chunks)
+        await self.client.latency.sleep()
+        message = SimpleNamespace(content=self.client.answer)
+        usage = SimpleNamespace(prompt_tokens=200, completion_tokens=150)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+class FakeTranscriptions:
+    def __init__(self, client):
+        self.client = client
+
+    async def create(self, **kwargs):
+        self.client.calls['whisper'] += 1
+        await self.client.latency.sleep()
+        return SimpleNamespace(text=self.client.transcript)
+
+
+class FakeOpenAI:
+    """Stand-in for AsyncOpenAI: chat (plain and streamed) and Whisper, after `latency` seconds."""
+
+    def __init__(self, latency=0.5, sigma=0.0, answer="ចម្លើយសាកល្បង", transcript="ពិន័យមិនពាក់មួកសុវត្ថិភាព",
+                 stream_chunks=8, rng=None):
+        self.latency = Latency(latency, sigma, rng)
+        self.answer = answer
+        self.transcript = transcript
+        self.stream_chunks = stream_chunks
+        self.calls = Counter()
+        self.chat = SimpleNamespace(completions=FakeCompletions(self))
+        self.audio = SimpleNamespace(transcriptions=FakeTranscriptions(self))
+
+
+# --- POSTGRES ---
+
+class FakeConnection:
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def fetch(self, query, *args):
+        await self.pool.latency.sleep()
+        return self.pool.answer(query, args)
+
+    async def fetchrow(self, query, *args):
+        rows = await self.fetch(query, *args)
+        return rows[0] if rows else None
+
+    async def fetchval(self, query, *args):
+        row = await self.fetchrow(query, *args)
+        return row[0] if row else None
+
+    async def execute(self, query, *args):
+        await self.fetch(query, *args)
+
+
+class FakePool:
+    """asyncpg.Pool stand-in over in-memory law tables: at most max_size connections
+    are handed out, each query waits `latency`. Unknown queries answer no rows."""
+
+    def __init__(self, articles, embeddings=(), latency=0.005, sigma=0.3, max_size=20):
+        self.articles = list(articles)
+        self.by_id = {r[0]: r for r in self.articles}
+        # (article_id, chunk_index, chunk, embedding bytes) as written by import_tool
+        self.embeddings = list(embeddings)
+        self.texts = {}
+        self.latency = Latency(latency, sigma)
+        self.max_size = max_size
+        self.in_use = 0
+        self.size = 0
+        self.queries = Counter()
+        self._slots = asyncio.Semaphore(max_size)
+
+    async def acquire(self, timeout=None):
+        await asyncio.wait_for(self._slots.acquire(), timeout)
+        self.in_use += 1
+        self.size = max(self.size, self.in_use)
+        return FakeConnection(self)
+
+    async def release(self, connection):
+        self.in_use -= 1
+        self._slots.release()
+
+    def get_size(self):
+        return self.size
+
+    def get_idle_size(self):
+        return self.size - self.in_use
+
+    async def close(self):
+        pass
+
+    def answer(self, query, args):
+        if query.strip() == "SELECT 1":
+            self.queries['health'] += 1
+            return [(1,)]
+        if 'law_embeddings' in query:
+            self.queries['embeddings'] += 1
+            wanted = set(args[0]) if args else None
+            return [(a, self.by_id[a][3], self.by_id[a][1], chunk, vector)
+                    for a, _, chunk, vector in self.embeddings if wanted is None or a in wanted]
+        if 'INSERT INTO law_article_texts' in query:
+            self.queries['texts_write'] += 1
+            self.texts[args[0], args[1]] = (args[2], args[3])
+            return []
+        if 'FROM law_article_texts' in query:
+            self.queries['texts_read'] += 1
+            stored = self.texts.get((args[0], args[1]))
+            return [(stored[1],)] if stored and stored[0] == args[2] else []
+        if query.startswith("SELECT id, law_code, section, article_title, content FROM law_articles"):
+            self.queries['catalog'] += 1
+            wanted = set(args[0]) if args else None
+            return [r for r in self.articles if wanted is None or r[0] in wanted]
+        if query.startswith("SELECT article_title, content, section, law_code FROM law_articles WHERE id"):
+            self.queries['article'] += 1
+            r = self.by_id.get(args[0])
+            return [(r[3], r[4], r[2], r[1])] if r else []
+        # The DB fallbacks behind the navigation menus
+        if query.startswith("SELECT MIN(id), section FROM law_articles WHERE law_code"):
+            self.queries['sections'] += 1
+            sections = {}
+            for r in self.articles:
+                if r[1] == args[0]:
+                    sections[r[2]] = min(sections.get(r[2], r[0]), r[0])
+            return [(section_id, section) for section, section_id in sorted(sections.items())]
+        if query.startswith("SELECT MIN(id) FROM law_articles WHERE law_code"):
+            self.queries['section_id'] += 1
+            return [(min((r[0] for r in self.articles if r[1] == args[0] and r[2] == args[1]), default=None),)]
+        if query.startswith("SELECT law_code, section FROM law_articles WHERE id"):
+            self.queries['section'] += 1
+            r = self.by_id.get(args[0])
+            return [(r[1], r[2])] if r else []
+        if query.startswith("SELECT id, article_title FROM law_articles WHERE law_code"):
+            self.queries['section_articles'] += 1
+            return [(r[0], r[3]) for r in self.articles if r[1] == args[0] and r[2] == args[1]]
+        self.queries['unhandled'] += 1
+        return []
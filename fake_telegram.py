@@ -0,0 +1,133 @@
+"""Local stand-in for the Telegram Bot API, for benchmarks that must not touch the network."""
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+
+from telegram.request import BaseRequest
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'LawBot', 'username': 'law_bot'}
+
+
+class FakeTelegram(BaseRequest):
+    """BaseRequest that answers Bot API calls locally after `latency` seconds.
+    `files` maps file_id -> bytes served by getFile and the download that follows."""
+
+    def __init__(self, latency=0.0, files=None):
+        self.latency = latency
+        self.files = files if files is not None else {}
+        self.calls = Counter()
+        self._message_ids = itertools.count(1000)
+        self._waiters = []
+
+    @property
+    def read_timeout(self):
+        return 5.0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit('/', 1)[-1]
+        params = request_data.parameters if request_data else {}
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if '/file/bot' in url:
+            self.calls['download'] += 1
+            return 200, self.files.get(endpoint, b'')
+        self.calls[endpoint] += 1
+        self._wake()
+        return 200, json.dumps({'ok': True, 'result': self._result(endpoint, params)}).encode()
+
+    def _result(self, endpoint, params):
+        if endpoint == 'getMe':
+            return BOT_USER
+        if endpoint in ('sendMessage', 'editMessageText', 'sendPhoto', 'sendVoice'):
+            return {
+                'message_id': params.get('message_id') or next(self._message_ids),
+                'date': int(time.time()),
+                'chat': {'id': params.get('chat_id', 1), 'type': 'private'},
+                'from': BOT_USER,
+                'text': params.get('text', ''),
+            }
+        if endpoint == 'getFile':
+            file_id = params.get('file_id')
+            return {'file_id': file_id, 'file_unique_id': 'u', 'file_size': len(self.files.get(file_id, b'')),
+                    'file_path': file_id}
+        return True
+
+    def _wake(self):
+        for waiter in list(self._waiters):
+            target, calls, future = waiter
+            if sum(self.calls[c] for c in calls) >= target and not future.done():
+                future.set_result(None)
+                self._waiters.remove(waiter)
+
+    async def wait_for(self, target, calls=('sendMessage', 'editMessageText')):
+        """Wait until `target` replies in total have been sent."""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((target, calls, future))
+        self._wake()
+        await future
+
+
+_update_ids = itertools.count(1)
+
+
+def _message_update(chat_id, **content):
+    update_id = next(_update_ids)
+    message = {
+        'message_id': update_id,
+        'date': int(time.time()),
+        'chat': {'id': chat_id, 'type': 'private'},
+        'from': {'id': chat_id, 'is_bot': False, 'first_name': f'User{chat_id}'},
+        **content,
+    }
+    return {'update_id': update_id, 'message': message}
+
+
+def text_update(chat_id, text):
+    content = {'text': text}
+    if text.startswith('/'):
+        content['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return _message_update(chat_id, **content)
+
+
+def callback_update(chat_id, data):
+    update_id = next(_update_ids)
+    user = {'id': chat_id, 'is_bot': False, 'first_name': f'User{chat_id}'}
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'from': user,
+            'chat_instance': str(chat_id),
+            'data': data,
+            'message': {
+                'message_id': update_id,
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': BOT_USER,
+                'text': 'menu',
+            },
+        },
+    }
+
+
+def voice_update(chat_id, file_id, file_size, duration=5):
+    return _message_update(chat_id, voice={'file_id': file_id, 'file_unique_id': file_id,
+                                           'duration': duration, 'file_size': file_size})
+
+
+def photo_update(chat_id, file_id, file_size, width=1280, height=960):
+    # Telegram sends several renditions; the bot picks one by size
+    sizes = [(width // 4, height // 4), (width // 2, height // 2), (width, height)]
+    return _message_update(chat_id, photo=[
+        {'file_id': file_id, 'file_unique_id': f"{file_id}_{w}", 'width': w, 'height': h, 'file_size': file_size}
+        for w, h in sizes
+    ])
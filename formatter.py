@@ -0,0 +1,246 @@
+"""Turn LLM/DB text into Telegram HTML that the Bot API accepts on the first try.
+
+One left-to-right pass over the text:
+- the HTML tags Telegram supports (<b>, <i>, <u>, <s>, <code>, <pre>, <a href>) are kept,
+  any other '<', '>' or '&' is escaped;
+- the Markdown the model writes (**bold**, *bold*, `code`, ```blocks```, # headings,
+  '* ' / '- ' bullets) is converted;
+- unmatched Markdown markers stay literal and tags left open are closed,
+  so the result is always well nested.
+
+split_html() then cuts the HTML into <= 4096-character messages, closing and
+re-opening tags at each cut.
+"""
+import re
+
+MAX_MESSAGE_LENGTH = 4096
+
+_TAG_ALIASES = {
+    'b': 'b', 'strong': 'b', 'i': 'i', 'em': 'i', 'u': 'u', 'ins': 'u',
+    's': 's', 'strike': 's', 'del': 's', 'code': 'code', 'pre': 'pre', 'a': 'a',
+}
+# Tags inside which Telegram allows no other formatting
+_VERBATIM = ('code', 'pre')
+# Markdown markers that must be closed on the same line
+_INLINE = ('*', '**', '`')
+_LINK = re.compile(r'(?:https?|tg)://\S+$')
+
+_TOKEN = re.compile(
+    r"(?P<heading>^[ \t]*#{1,6}[ \t]+)"
+    r"|(?P<bullet>^[ \t]*[*\-][ \t]+)"
+    r"|(?P<fence>```[A-Za-z0-9+#-]*\n?)"
+    r"|(?P<tag><(?P<close>/)?(?P<name>[a-zA-Z]+)(?:\s+href\s*=\s*(?P<q>['\"])(?P<href>[^'\"<>]*)(?P=q))?\s*>)"
+    r"|(?P<md>\*\*|\*|`)"
+    r"|(?P<newline>\n)"
+    r"|(?P<special>[&<>\"])",
+    re.MULTILINE,
+)
+_ESCAPES = {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;'}
+
+
+def escape(text):
+    """Escape plain text for Telegram HTML."""
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
+
+
+def _open_tag(name, href=None):
+    return f'<a href="{escape(href)}">' if name == 'a' else f'<{name}>'
+
+
+class _Renderer:
+    def __init__(self):
+        self.out = []
+        # [tag or None, source marker, index of the opening piece in out]
+        # tag is None when an identical tag is already open (Telegram rejects <b><b>)
+        self.stack = []
+
+    def is_open(self, tag):
+        return any(entry[0] == tag for entry in self.stack)
+
+    def verbatim(self):
+        return self.stack and self.stack[-1][0] in _VERBATIM
+
+    def open(self, tag, marker, piece):
+        if self.is_open(tag):
+            tag, piece = None, ''
+        self.stack.append([tag, marker, len(self.out)])
+        self.out.append(piece)
+
+    def close(self, marker):
+        """Close the innermost entry opened by `marker`; inner entries are closed first."""
+        for pos in range(len(self.stack) - 1, -1, -1):
+            if self.stack[pos][1] == marker:
+                break
+        else:
+            return False
+        while len(self.stack) > pos:
+            tag, entry_marker, index = self.stack.pop()
+            if entry_marker in _INLINE and entry_marker != marker:
+                # Unmatched inline marker inside the span being closed: show it as typed
+                self.out[index] = entry_marker
+            elif tag:
+                self.out.append(f'</{tag}>')
+        return True
+
+    def end_line(self):
+        """Inline Markdown and headings never span lines."""
+        for pos in range(len(self.stack) - 1, -1, -1):
+            tag, marker, index = self.stack[pos]
+            if marker == '#':
+                self.close('#')
+                return self.end_line()
+            if marker in _INLINE:
+                del self.stack[pos]
+                self.out[index] = marker
+
+    def finish(self):
+        self.end_line()
+        while self.stack:
+            tag, _, _ = self.stack.pop()
+            if tag:
+                self.out.append(f'</{tag}>')
+        return ''.join(self.out)
+
+
+def to_html(text):
+    """Convert mixed Markdown/HTML/plain text into well-formed Telegram HTML."""
+    text = str(text or '')
+    r = _Renderer()
+    pos = 0
+    for m in _TOKEN.finditer(text):
+        if m.start() > pos:
+            r.out.append(text[pos:m.start()])
+        pos = m.end()
+        kind = m.lastgroup
+        token = m.group()
+
+        if r.verbatim():
+            top_tag, top_marker, _ = r.stack[-1]
+            if kind == 'fence' and top_marker == '```':
+                r.close('```')
+                if token.endswith('\n'):
+                    r.out.append('\n')
+            elif kind == 'md' and token == '`' and top_marker == '`':
+                r.close('`')
+            elif kind == 'tag' and m.group('close') and _TAG_ALIASES.get(m.group('name').lower()) == top_tag \
+                    and top_marker == top_tag:
+                r.close(top_tag)
+            elif kind == 'newline' and top_marker == '`':
+                r.end_line()
+                r.out.append('\n')
+            else:
+                r.out.append(escape(token))
+            continue
+
+        if kind == 'heading':
+            r.open('b', '#', '<b>')
+        elif kind == 'bullet':
+            r.out.append(token[:len(token) - len(token.lstrip())] + '• ')
+        elif kind == 'fence':
+            r.open('pre', '```', '<pre>')
+        elif kind == 'tag':
+            tag = _TAG_ALIASES.get(m.group('name').lower())
+            href = m.group('href')
+            if m.group('close'):
+                if tag is None or not r.close(tag):
+                    r.out.append(escape(token))
+            elif tag is None or (href is not None) != (tag == 'a') or (href and not _LINK.match(href)):
+                r.out.append(escape(token))
+            else:
+                r.open(tag, tag, _open_tag(tag, href))
+        elif kind == 'md':
+            if token == '`':
+                line_end = text.find('\n', pos)
+                if text.find('`', pos, len(text) if line_end < 0 else line_end) >= 0:
+                    r.open('code', '`', '<code>')
+                else:
+                    r.out.append(token)
+            elif any(entry[1] == token for entry in r.stack) and not text[m.start() - 1].isspace():
+                r.close(token)
+            elif pos < len(text) and not text[pos].isspace() and not text[m.start() - 1:m.start()].isalnum():
+                # Like Markdown, a*b is not emphasis
+                r.open('b', token, '<b>')
+            else:
+                r.out.append(token)
+        elif kind == 'newline':
+            r.end_line()
+            r.out.append('\n')
+        else:
+            r.out.append(_ESCAPES[token])
+    r.out.append(text[pos:])
+    return r.finish()
+
+
+_HTML_PIECE = re.compile(r'<(/?)([a-z]+)[^>]*>|&[a-z]+;|[^<&]+')
+
+
+def _units(text):
+    # Telegram counts message length in UTF-16 code units
+    return len(text.encode('utf-16-le')) // 2
+
+
+def _prefix(text, room):
+    """Longest prefix of text that fits in `room` UTF-16 units."""
+    units = 0
+    for i, ch in enumerate(text):
+        units += 2 if ord(ch) > 0xFFFF else 1
+        if units > room:
+            return text[:i]
+    return text
+
+
+def split_html(html, limit=MAX_MESSAGE_LENGTH):
+    """Split well-formed Telegram HTML into chunks of at most `limit` visible characters."""
+    if _units(html) <= limit:
+        # Markup only adds length, so the common short answer needs no parsing
+        return [html] if re.sub(r'<[^>]+>', '', html).strip() else ['…']
+    chunks = []
+    open_tags = []  # (name, opening tag)
+    current, length = [], 0
+
+    def flush():
+        nonlocal current, length
+        body = ''.join(current) + ''.join(f'</{name}>' for name, _ in reversed(open_tags))
+        if re.sub(r'<[^>]+>', '', body).strip():
+            chunks.append(body)
+        current, length = [piece for _, piece in open_tags], 0
+
+    for m in _HTML_PIECE.finditer(html):
+        piece = m.group()
+        if piece.startswith('<'):
+            if m.group(1):
+                open_tags.pop()
+            else:
+                open_tags.append((m.group(2), piece))
+            current.append(piece)
+            continue
+        if piece.startswith('&'):
+            if length + 1 > limit:
+                flush()
+            current.append(piece)
+            length += 1
+            continue
+        while length + _units(piece) > limit:
+            head = _prefix(piece, limit - length)
+            # Prefer to cut after a newline or space, unless that wastes over half the room
+            cut = max(head.rfind('\n'), head.rfind(' '))
+            if cut >= len(head) // 2:
+                head = head[:cut + 1]
+            current.append(head)
+            piece = piece[len(head):]
+            flush()
+        current.append(piece)
+        length += _units(piece)
+    flush()
+    return chunks or ['…']
+
+
+def render(text, limit=MAX_MESSAGE_LENGTH):
+    """to_html + split_html: the list of messages to send, in order."""
+    return split_html(to_html(text), limit)
+
+
+def strip_tags(html):
+    """Plain-text version of formatter output, for the rare fallback path."""
+    text = re.sub(r'<[^>]+>', '', html)
+    return text.replace('&lt;', '<').replace('&gt;', '>').replace('&quot;', '"').replace('&amp;', '&')
@@ -1,19 +1,130 @@
 import psycopg2
+import psycopg2.extras
 import os
+import argparse
+import asyncio
+import hashlib
+import json
+import time
+from collections import namedtuple
 from dotenv import load_dotenv
+from semantic_search import get_embedder, embed_articles
 
 load_dotenv()
 
-def save_to_db(cur, code, section, title, content):
-    try:
-        cur.execute("""
-            INSERT INTO law_articles (law_code, section, article_title, content)
-            VALUES (%s, %s, %s, %s)
-        """, (code, section, title, content))
-    except Exception as e:
-        print(f"❌ Error saving {title}: {e}")
+BATCH_SIZE = 500
+TITLE_MAX_LEN = 100  # law_articles.article_title VARCHAR(100)
+ARTICLE_NO_MAX_LEN = 20  # law_articles.article_no VARCHAR(20)
+
+Article = namedtuple('Article', 'law_code section article_no title content')
+
+KHMER_DIGITS = str.maketrans("០១២៣៤៥៦៧៨៩", "0123456789")
+
+def article_number(title):
+    """'មាត្រា ១២: ...' -> '12' (the key used for upserts)"""
+    return title.split(":")[0].replace("មាត្រា", "").strip().translate(KHMER_DIGITS)
+
+def article_hash(article):
+    """sha256 over everything stored for an article, used to detect edits on re-sync."""
+    text = "\x1f".join((article.law_code, article.section, article.title, article.content))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def parse_law_file(filename, errors):
+    """Read the file line by line and yield one Article per 'មាត្រា' block.
+    Problems are appended to `errors` as (line_no, message) instead of stopping the import."""
+    law_code = "general"
+    section = "ទូទៅ"
+    title = None
+    title_line = 0
+    content = []
+    seen = set()
+
+    def finish():
+        if not content:
+            errors.append((title_line, f"មាត្រាគ្មានខ្លឹមសារ: {title}"))
+            return None
+        if len(title) > TITLE_MAX_LEN:
+            errors.append((title_line, f"ចំណងជើងវែងជាង {TITLE_MAX_LEN} តួ: {title[:40]}..."))
+            return None
+        key = (law_code, article_number(title))
+        if len(key[1]) > ARTICLE_NO_MAX_LEN:
+            errors.append((title_line, f"លេខមាត្រាវែងជាង {ARTICLE_NO_MAX_LEN} តួ: {key[1][:40]}"))
+            return None
+        if key in seen:
+            errors.append((title_line, f"មាត្រាស្ទួន {key[1]} ក្នុង {law_code}"))
+            return None
+        seen.add(key)
+        return Article(law_code, section, key[1], title, "\n".join(content))
+
+    with open(filename, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line: continue
+
+            is_law_code = line.startswith("LAW_CODE:")
+            is_section = line.startswith("SECTION:")
+            is_article = line.startswith("មាត្រា") and ":" in line
+
+            if (is_law_code or is_section or is_article) and title:
+                article = finish()
+                if article: yield article
+                title = None
+
+            if is_law_code:
+                law_code = line.split(":")[1].strip()
+                print(f"📂 កំណត់ច្បាប់៖ {law_code}")
+            elif is_section:
+                section = line.replace("SECTION:", "").strip()
+                print(f"  Start Section: {section}")
+            elif is_article:
+                title = line
+                title_line = line_no
+                content = []
+            elif title:
+                content.append(line)
+            else:
+                errors.append((line_no, f"អត្ថបទនៅក្រៅមាត្រា: {line[:40]}"))
+
+    if title:
+        article = finish()
+        if article: yield article
 
-def import_laws_from_text(filename):
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def upsert_articles(cur, batch):
+    """Insert or update a batch on (law_code, article_no); return [(id, content, inserted)]."""
+    rows = psycopg2.extras.execute_values(cur, """
+        INSERT INTO law_articles (law_code, section, article_no, article_title, content, content_hash)
+        VALUES %s
+        ON CONFLICT (law_code, article_no) DO UPDATE SET
+            section = EXCLUDED.section,
+            article_title = EXCLUDED.article_title,
+            content = EXCLUDED.content,
+            content_hash = EXCLUDED.content_hash
+        RETURNING id, content, (xmax = 0) AS inserted
+    """, [tuple(a) + (article_hash(a),) for a in batch], page_size=len(batch), fetch=True)
+    return rows
+
+def save_embeddings(cur, runner, articles):
+    """Chunk + embed the saved articles so the bot can do RAG over them.
+    Errors propagate, so the caller rolls back instead of keeping articles without vectors."""
+    articles = [(article_id, content) for article_id, content, _ in articles]
+    rows = runner.run(embed_articles(get_embedder(), articles))
+    cur.execute("DELETE FROM law_embeddings WHERE article_id = ANY(%s)", ([a for a, _ in articles],))
+    psycopg2.extras.execute_values(cur, """
+        INSERT INTO law_embeddings (article_id, chunk_index, chunk, embedding) VALUES %s
+    """, [(a, i, c, psycopg2.Binary(v)) for a, i, c, v in rows], page_size=1000)
+    return len(rows)
+
+def import_laws_from_text(filename, batch_size=BATCH_SIZE):
     if not os.path.exists(filename):
         print(f"❌ រកមិនឃើញ file {filename} ទេ! សូមបង្កើតវាសិន។")
         return
@@ -25,49 +136,123 @@ def import_laws_from_text(filename):
         print(f"❌ DB Connection Error: {e}")
         return
 
-    with open(filename, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
+    print("🚀 កំពុងចាប់ផ្តើមបញ្ចូលទិន្នន័យ...")
+    errors = []
+    total = chunks = 0
+    start = time.perf_counter()
+    # One event loop for the whole import: the shared AsyncOpenAI client is bound to it
+    runner = asyncio.Runner()
+    try:
+        for batch in batched(parse_law_file(filename, errors), batch_size):
+            saved = upsert_articles(cur, batch)
+            chunks += save_embeddings(cur, runner, saved)
+            total += len(saved)
+            elapsed = time.perf_counter() - start
+            print(f"    -> {total} មាត្រា ({total / elapsed:.0f} rows/s), {len(errors)} errors")
 
-    current_law_code = "general"
-    current_section = "ទូទៅ"
-    current_title = None
-    current_content = []
+        # Tell running bots to reload their in-memory law catalog
+        cur.execute("NOTIFY law_catalog")
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Import Error (rolled back): {e}")
+        return
+    finally:
+        runner.close()
+        cur.close()
+        conn.close()
 
-    print("🚀 កំពុងចាប់ផ្តើមបញ្ចូលទិន្នន័យ...")
+    elapsed = time.perf_counter() - start
+    for line_no, message in errors:
+        print(f"⚠️ line {line_no}: {message}")
+    print(f"🧠 បានបង្កើត Embedding {chunks} chunks")
+    print(f"✅ បញ្ចូលទិន្នន័យចប់សព្វគ្រប់! {total} មាត្រា ក្នុង {elapsed:.1f}s, {len(errors)} errors")
 
-    for line in lines:
-        line = line.strip()
-        if not line: continue
+def sync_laws_from_text(filename, batch_size=BATCH_SIZE):
+    """Incremental import: only write articles whose content hash changed and delete
+    the ones that disappeared from the file, all in one transaction."""
+    if not os.path.exists(filename):
+        print(f"❌ រកមិនឃើញ file {filename} ទេ! សូមបង្កើតវាសិន។")
+        return None
 
-        if line.startswith("LAW_CODE:"):
-            current_law_code = line.split(":")[1].strip()
-            print(f"📂 កំណត់ច្បាប់៖ {current_law_code}")
+    try:
+        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        cur = conn.cursor()
+    except Exception as e:
+        print(f"❌ DB Connection Error: {e}")
+        return None
+
+    print("🔄 កំពុងធ្វើសមកាលកម្ម (sync)...")
+    errors = []
+    changes = {'inserted': [], 'updated': [], 'deleted': []}
+    start = time.perf_counter()
+    runner = asyncio.Runner()
+    try:
+        cur.execute("SELECT law_code, article_no, id, content_hash FROM law_articles")
+        existing = {(code, no): (art_id, h) for code, no, art_id, h in cur.fetchall()}
+        # Earlier syncs committed hashes even when embedding failed; re-embed those articles
+        cur.execute("SELECT id FROM law_articles a WHERE NOT EXISTS (SELECT 1 FROM law_embeddings e WHERE e.article_id = a.id)")
+        unembedded = {art_id for art_id, in cur.fetchall()}
+
+        seen_codes = set()
 
-        elif line.startswith("SECTION:"):
-            if current_title and current_content:
-                save_to_db(cur, current_law_code, current_section, current_title, "\n".join(current_content))
-                current_content = []
-                current_title = None
-            current_section = line.replace("SECTION:", "").strip()
-            print(f"  Start Section: {current_section}")
+        def changed_articles():
+            for article in parse_law_file(filename, errors):
+                seen_codes.add(article.law_code)
+                old = existing.pop((article.law_code, article.article_no), None)
+                if old is None or old[1] != article_hash(article) or old[0] in unembedded:
+                    yield article
 
-        elif line.startswith("មាត្រា") and ":" in line:
-            if current_title and current_content:
-                save_to_db(cur, current_law_code, current_section, current_title, "\n".join(current_content))
-            current_title = line
-            current_content = []
-            print(f"    -> Saving: {line}")
+        for batch in batched(changed_articles(), batch_size):
+            saved = upsert_articles(cur, batch)
+            for art_id, _, inserted in saved:
+                changes['inserted' if inserted else 'updated'].append(art_id)
+            # Raises on failure: the new content_hash must not be committed without its vectors
+            save_embeddings(cur, runner, saved)
 
-        else:
-            current_content.append(line)
+        # Whatever is left in `existing` for the law codes in this file is gone from it.
+        # Skip deletes when the parse had errors, since a skipped article would look deleted.
+        removed = [art_id for (code, _), (art_id, _) in existing.items() if code in seen_codes]
+        if errors:
+            print(f"⚠️ {len(errors)} parse errors: មិនលុបមាត្រាដែលបាត់ទេ")
+        elif removed:
+            changes['deleted'] = removed
+            cur.execute("DELETE FROM law_articles WHERE id = ANY(%s)", (changes['deleted'],))
+
+        if any(changes.values()):
+            cur.execute("SELECT pg_notify('law_catalog', %s)", (change_payload(changes),))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Sync Error (rolled back): {e}")
+        return None
+    finally:
+        runner.close()
+        cur.close()
+        conn.close()
 
-    if current_title and current_content:
-        save_to_db(cur, current_law_code, current_section, current_title, "\n".join(current_content))
+    for line_no, message in errors:
+        print(f"⚠️ line {line_no}: {message}")
+    elapsed = time.perf_counter() - start
+    print(f"✅ Sync ចប់: +{len(changes['inserted'])} ~{len(changes['updated'])} -{len(changes['deleted'])} ក្នុង {elapsed:.1f}s")
+    return changes
 
-    conn.commit()
-    cur.close()
-    conn.close()
-    print("✅ បញ្ចូលទិន្នន័យចប់សព្វគ្រប់!")
+def change_payload(changes):
+    """NOTIFY payloads are capped at 8000 bytes; fall back to a full reload signal."""
+    payload = json.dumps({'upserted': changes['inserted'] + changes['updated'], 'deleted': changes['deleted']})
+    return payload if len(payload) < 7900 else json.dumps({'full': True})
 
 if __name__ == "__main__":
-    import_laws_from_text("raw_law.txt")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Import law articles from a text file")
+    parser.add_argument("filename", nargs="?", default="raw_law.txt")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--sync", action="store_true", help="only apply changed/new/removed articles")
+    parser.add_argument("--changes-out", help="write the sync change set to this JSON file")
+    args = parser.parse_args()
+    if args.sync:
+        changes = sync_laws_from_text(args.filename, args.batch_size)
+        if changes is not None and args.changes_out:
+            with open(args.changes_out, 'w', encoding='utf-8') as f:
+                json.dump(changes, f)
+    else:
+        import_laws_from_text(args.filename, args.batch_size)
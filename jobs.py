@@ -0,0 +1,242 @@
+"""Persistent background jobs for slow AI work (voice, photo, documents).
+
+Handlers enqueue a job and return; workers claim jobs from a SQLite table, run the
+registered coroutine, and edit the user's status message. Jobs are keyed by the
+Telegram update id, so a redelivered update is not processed twice. A job that
+raises Retry or hits a network error is retried with backoff up to max_attempts; any
+other error fails it at once, and one past its deadline is dropped.
+
+JOB_WORKERS sets workers per bot process (0 = none); BOT_MODE=worker runs workers only,
+so they can be scaled apart from the front end on the same JOB_QUEUE_DB.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, namedtuple
+
+from dotenv import load_dotenv
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+import metrics
+
+load_dotenv()
+
+# --- CONFIGURATION ---
+JOB_QUEUE_DB = os.getenv('JOB_QUEUE_DB', 'jobs.db')
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+JOB_RETRY_DELAY = float(os.getenv('JOB_RETRY_DELAY', '2'))
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '0.5'))
+# How often workers drop finished jobs (and run the other purges they were given)
+JOB_PURGE_INTERVAL = float(os.getenv('JOB_PURGE_INTERVAL', '3600'))
+JOB_KEEP_SECONDS = int(os.getenv('JOB_KEEP_SECONDS', str(7 * 24 * 3600)))
+# Seconds from enqueue until the answer is no longer worth sending
+JOB_DEADLINES = {
+    'voice': 120,
+    'photo': 120,
+    'document': 180,
+}
+DEFAULT_DEADLINE = 120
+# A running job whose worker died is handed out again after this long
+LEASE_SECONDS = max(JOB_DEADLINES.values()) + 30
+
+Job = namedtuple('Job', 'id kind update_id user_id chat_id message_id payload attempts max_attempts deadline')
+
+
+class Retry(Exception):
+    """Raised by a job function for a transient failure it wants retried."""
+
+
+def is_transient(error):
+    """Worth another attempt: Retry, or Telegram/network trouble that may clear up.
+    BadRequest is a NetworkError subclass but fails the same way every time."""
+    if isinstance(error, BadRequest):
+        return False
+    return isinstance(error, (Retry, NetworkError, RetryAfter, ConnectionError))
+
+
+class JobQueue:
+    """Synchronous; the bot calls it through asyncio.to_thread, since another process
+    holding the file's write lock can make a call wait (up to the 30s busy timeout)."""
+
+    def __init__(self, db_path=JOB_QUEUE_DB):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._connection = None
+        self.outcomes = Counter()
+
+    @property
+    def _db(self):
+        # Opened on first use, so importing the bot creates no file
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None,
+                                               check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id INTEGER PRIMARY KEY,"
+                " kind TEXT NOT NULL,"
+                " update_id INTEGER NOT NULL UNIQUE,"
+                " user_id INTEGER, chat_id INTEGER NOT NULL, message_id INTEGER,"
+                " payload TEXT NOT NULL,"
+                " state TEXT NOT NULL DEFAULT 'queued',"
+                " attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL,"
+                " run_after REAL NOT NULL, deadline REAL NOT NULL, lease_until REAL,"
+                " error TEXT, created_at REAL NOT NULL, finished_at REAL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (state, run_after)")
+        return self._connection
+
+    def seen(self, update_id):
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM jobs WHERE update_id = ?", (update_id,)).fetchone() is not None
+
+    def enqueue(self, kind, update_id, chat_id, message_id, payload, user_id=None, max_attempts=JOB_MAX_ATTEMPTS):
+        """Queue a job; returns its id, or None if this update was already queued."""
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO jobs (kind, update_id, user_id, chat_id, message_id, payload, max_attempts,"
+                " run_after, deadline, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (kind, update_id, user_id, chat_id, message_id, json.dumps(payload, ensure_ascii=False), max_attempts,
+                 now, now + JOB_DEADLINES.get(kind, DEFAULT_DEADLINE), now)
+            )
+            if not cursor.rowcount:
+                self.outcomes['duplicate'] += 1
+                return None
+            self.outcomes['queued'] += 1
+            return cursor.lastrowid
+
+    def claim(self):
+        """Atomically take the oldest ready job (or one whose lease ran out), or None."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "UPDATE jobs SET state = 'running', attempts = attempts + 1, lease_until = ?"
+                " WHERE id = (SELECT id FROM jobs WHERE (state = 'queued' AND run_after <= ?)"
+                "             OR (state = 'running' AND lease_until < ?) ORDER BY id LIMIT 1)"
+                " RETURNING id, kind, update_id, user_id, chat_id, message_id, payload, attempts, max_attempts, deadline",
+                (now + LEASE_SECONDS, now, now)
+            ).fetchone()
+        if row is None:
+            return None
+        return Job(*row[:6], json.loads(row[6]), *row[7:])
+
+    def finish(self, job_id, state, error=None):
+        with self._lock:
+            self._db.execute("UPDATE jobs SET state = ?, error = ?, finished_at = ? WHERE id = ?",
+                             (state, error, time.time(), job_id))
+            self.outcomes[state] += 1
+
+    def retry(self, job_id, error, delay):
+        with self._lock:
+            self._db.execute("UPDATE jobs SET state = 'queued', error = ?, run_after = ? WHERE id = ?",
+                             (error, time.time() + delay, job_id))
+            self.outcomes['retried'] += 1
+
+    def depth(self):
+        with self._lock:
+            return dict(self._db.execute("SELECT state, COUNT(*) FROM jobs WHERE state IN ('queued', 'running') GROUP BY state"))
+
+    def purge(self, older_than=JOB_KEEP_SECONDS):
+        with self._lock:
+            self._db.execute("DELETE FROM jobs WHERE finished_at < ?", (time.time() - older_than,))
+
+
+queue = JobQueue()
+
+
+class Workers:
+    """`count` asyncio workers running jobs with `handlers[kind](bot, job)`.
+    `on_failure(bot, job, reason)` tells the user when a job gives up ('failed' or 'expired').
+    Every JOB_PURGE_INTERVAL old jobs are dropped and each of `purges()` is run in a thread."""
+
+    def __init__(self, bot, handlers, on_failure, count=JOB_WORKERS, job_queue=None, purges=()):
+        self.bot = bot
+        self.handlers = handlers
+        self.on_failure = on_failure
+        self.count = count
+        self.queue = job_queue or queue
+        self.purges = list(purges)
+        self.busy = 0
+        self._wake = asyncio.Event()
+        self._tasks = []
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.count)]
+        self._tasks.append(asyncio.create_task(self._purge_periodically()))
+        return self
+
+    def notify(self):
+        """Wake an idle worker right away instead of at its next poll."""
+        self._wake.set()
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self):
+        while True:
+            job = await asyncio.to_thread(self.queue.claim)
+            if job is None:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self.busy += 1
+            try:
+                await self._execute(job)
+            finally:
+                self.busy -= 1
+
+    async def _purge_periodically(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.queue.purge)
+            except Exception as e:
+                print(f"Purge Error: {e}")
+            for purge in self.purges:
+                try:
+                    await asyncio.to_thread(purge)
+                except Exception as e:
+                    print(f"Purge Error: {e}")
+            await asyncio.sleep(JOB_PURGE_INTERVAL)
+
+    async def _execute(self, job):
+        remaining = job.deadline - time.time()
+        if remaining <= 0:
+            await asyncio.to_thread(self.queue.finish, job.id, 'expired')
+            await self._give_up(job, 'expired')
+            return
+        try:
+            with metrics.timer(f"job.{job.kind}"):
+                await asyncio.wait_for(self.handlers[job.kind](self.bot, job), remaining)
+        except asyncio.TimeoutError:
+            await asyncio.to_thread(self.queue.finish, job.id, 'expired')
+            await self._give_up(job, 'expired')
+        except Exception as e:
+            print(f"Job Error: {job.kind} #{job.id} attempt {job.attempts}: {e}")
+            if is_transient(e) and job.attempts < job.max_attempts:
+                await asyncio.to_thread(self.queue.retry, job.id, str(e), JOB_RETRY_DELAY * 2 ** (job.attempts - 1))
+            else:
+                await asyncio.to_thread(self.queue.finish, job.id, 'failed', str(e))
+                await self._give_up(job, 'failed')
+        else:
+            await asyncio.to_thread(self.queue.finish, job.id, 'done')
+
+    async def _give_up(self, job, reason):
+        try:
+            await self.on_failure(self.bot, job, reason)
+        except Exception as e:
+            print(f"Job Error: could not report {reason} job #{job.id}: {e}")
+
+
+metrics.collect('lawbot_jobs_total', 'Background jobs by outcome.', lambda: queue.outcomes, kind='counter', label='outcome')
+metrics.collect('lawbot_jobs_pending', 'Jobs queued or running, across all processes.', queue.depth, label='state')
@@ -1,15 +1,63 @@
-from flask import Flask
-from threading import Thread
+import os
 
-app = Flask('')
+from aiohttp import web
 
-@app.route('/')
-def home():
-    return "Bot is alive!"
+import admission
+import ai_client
+import db
+import metrics
+from response_cache import cache
+from snapshot import law_snapshot
 
-def run():
-    app.run(host='0.0.0.0', port=8080)
+WEB_HOST = os.getenv('WEB_HOST', '0.0.0.0')
+WEB_PORT = int(os.getenv('PORT', '8080'))
 
-def keep_alive():
-    t = Thread(target=run)
-    t.start()
\ No newline at end of file
+
+async def home(request):
+    return web.Response(text="Bot is alive!")
+
+
+async def health(request):
+    if law_snapshot is None:
+        db_ok = await db.health_check()
+        return web.json_response({'ok': db_ok, 'db': db_ok, 'pool': db.pool_stats()}, status=200 if db_ok else 503)
+    # LAW_SOURCE=snapshot serves reads from the file; the DB (if any) only takes writes
+    ok = law_snapshot.loaded
+    db_ok = await db.health_check() if db.available() else None
+    return web.json_response({
+        'ok': ok,
+        'snapshot': {'path': law_snapshot.path, 'version': law_snapshot.version},
+        'db': db_ok,
+        'pool': db.pool_stats(),
+    }, status=200 if ok else 503)
+
+
+async def stats(request):
+    return web.json_response({
+        'admission': admission.controller.stats(),
+        'openai': ai_client.stats(),
+        'response_cache': cache.stats(),
+        'pool': db.pool_stats(),
+    })
+
+
+async def metrics_endpoint(request):
+    return web.Response(text=metrics.render(), content_type='text/plain')
+
+
+def add_health_routes(app):
+    app.router.add_get('/', home)
+    app.router.add_get('/health', health)
+    app.router.add_get('/stats', stats)
+    app.router.add_get('/metrics', metrics_endpoint)
+
+
+async def start_web_server(app=None, host=WEB_HOST, port=WEB_PORT, reuse_port=False):
+    """Serve `app` (or just the health routes) on the running event loop; returns the runner."""
+    if app is None:
+        app = web.Application()
+        add_health_routes(app)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port, reuse_port=reuse_port or None).start()
+    return runner
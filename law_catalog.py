@@ -0,0 +1,184 @@
+import asyncio
+import json
+
+import db
+
+NOTIFY_CHANNEL = 'law_catalog'
+
+
+class LawCatalog:
+    """In-process copy of law_articles: law_code -> sections -> articles -> content."""
+
+    def __init__(self):
+        self.version = 0
+        self.sections_by_code = {}
+        self.articles_by_section = {}
+        self.articles = {}
+        # Section id = smallest article id in the section (stable across unrelated edits)
+        self.sections_by_id = {}
+        self.section_ids = {}
+        # Position of an article within its section / a section within its law code, for paging
+        self.article_positions = {}
+        self.section_positions = {}
+        # {'upserted': [...], 'deleted': [...]} for incremental reloads, None after a full one
+        self.last_changes = None
+        self._listener = None
+        self._dsn = None
+        # Refreshes started by NOTIFY or a reconnect; kept so they aren't garbage-collected
+        self._tasks = set()
+        self._reload_hooks = []
+        self._refresh_lock = asyncio.Lock()
+
+    @property
+    def loaded(self):
+        return self.version > 0
+
+    def on_reload(self, hook):
+        """Call hook(catalog) after every load, e.g. to rebuild a search index."""
+        self._reload_hooks.append(hook)
+
+    def load(self, rows, changes=None):
+        """Build the lookup tables from (id, law_code, section, article_title, content) rows,
+        then swap them in at once."""
+        sections_by_code = {}
+        articles_by_section = {}
+        articles = {}
+        for art_id, law_code, section, title, content in sorted(rows, key=lambda r: (r[2], r[0])):
+            code_sections = sections_by_code.setdefault(law_code, [])
+            if not code_sections or code_sections[-1] != section:
+                code_sections.append(section)
+            articles_by_section.setdefault((law_code, section), []).append((art_id, title))
+            articles[art_id] = (title, content, section, law_code)
+        section_ids = {key: arts[0][0] for key, arts in articles_by_section.items()}
+        sections_by_id = {sid: key for key, sid in section_ids.items()}
+        section_positions = {
+            section_ids[(code, name)]: i
+            for code, names in sections_by_code.items()
+            for i, name in enumerate(names)
+        }
+        article_positions = {
+            art_id: i
+            for arts in articles_by_section.values()
+            for i, (art_id, _) in enumerate(arts)
+        }
+        # Plain attribute assignments, so handlers never see a half-built catalog
+        self.sections_by_code, self.articles_by_section = sections_by_code, articles_by_section
+        self.articles = articles
+        self.section_ids, self.sections_by_id = section_ids, sections_by_id
+        self.section_positions, self.article_positions = section_positions, article_positions
+        self.last_changes = changes
+        self.version += 1
+        for hook in self._reload_hooks:
+            hook(self)
+
+    async def refresh(self):
+        async with self._refresh_lock:
+            rows = await db.fetch("SELECT id, law_code, section, article_title, content FROM law_articles")
+            self.load(rows)
+            print(f"📚 Law catalog v{self.version}: {len(self.articles)} articles")
+
+    async def apply_changes(self, upserted, deleted):
+        """Re-read only the articles a sync touched and rebuild the tables around them."""
+        async with self._refresh_lock:
+            rows = []
+            if upserted:
+                rows = await db.fetch(
+                    "SELECT id, law_code, section, article_title, content FROM law_articles WHERE id = ANY($1::int[])",
+                    upserted
+                )
+            articles = dict(self.articles)
+            for art_id in deleted:
+                articles.pop(art_id, None)
+            for art_id, law_code, section, title, content in rows:
+                articles[art_id] = (title, content, section, law_code)
+            self.load(
+                [(art_id, code, sect, title, content) for art_id, (title, content, sect, code) in articles.items()],
+                changes={'upserted': upserted, 'deleted': deleted}
+            )
+            print(f"📚 Law catalog v{self.version}: +{len(rows)} -{len(deleted)} articles")
+
+    async def listen(self, dsn):
+        """Reload whenever an importer runs NOTIFY law_catalog. A JSON change set
+        payload from `import_tool.py --sync` is applied incrementally. If the connection
+        drops (hosted Postgres closes idle ones), reconnect and reload in full, since
+        notifications sent in between are lost."""
+        self._dsn = dsn
+        await self._connect()
+
+    async def _connect(self):
+        import asyncpg
+        listener = await asyncpg.connect(self._dsn, ssl='require')
+        listener.add_termination_listener(self._on_terminated)
+        await listener.add_listener(NOTIFY_CHANNEL, self._on_notify)
+        self._listener = listener
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self._spawn(self._refresh_safely(payload))
+
+    def _on_terminated(self, connection):
+        # Also called by close(), which clears _listener first
+        if connection is self._listener:
+            self._listener = None
+            self._spawn(self._reconnect())
+
+    async def _reconnect(self):
+        delay = 1
+        while self._dsn is not None:
+            try:
+                await self._connect()
+            except Exception as e:
+                print(f"Catalog Listen Error: {e}, retrying in {delay}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60)
+                continue
+            print("📚 Law catalog listener reconnected")
+            await self._refresh_safely()
+            return
+
+    def _spawn(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh_safely(self, payload=""):
+        try:
+            changes = json.loads(payload) if payload else {}
+            if self.loaded and 'upserted' in changes:
+                await self.apply_changes(changes['upserted'], changes.get('deleted', []))
+            else:
+                await self.refresh()
+        except Exception as e:
+            print(f"Catalog Refresh Error: {e}")
+
+    async def close(self):
+        self._dsn = None
+        for task in list(self._tasks):
+            task.cancel()
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            await listener.close()
+
+    # --- LOOKUPS ---
+
+    def get_sections(self, law_code):
+        return self.sections_by_code.get(law_code, [])
+
+    def get_section_list(self, law_code):
+        """[(section_id, section)] in menu order."""
+        return [(self.section_ids[(law_code, s)], s) for s in self.get_sections(law_code)]
+
+    def get_section(self, section_id):
+        """(law_code, section) for a section id, or None if it no longer exists."""
+        return self.sections_by_id.get(section_id)
+
+    def get_section_id(self, law_code, section):
+        return self.section_ids.get((law_code, section))
+
+    def get_articles_by_section(self, law_code, section):
+        return self.articles_by_section.get((law_code, section), [])
+
+    def get_content(self, article_id):
+        return self.articles.get(article_id)
+
+
+catalog = LawCatalog()
@@ -1,138 +1,177 @@
 import logging
 import os
-import base64
-import psycopg2
-from psycopg2 import pool
 import warnings
-import uuid
-import re 
-from openai import OpenAI
-from duckduckgo_search import DDGS
+import asyncio
+import time
+from datetime import datetime, timezone
 from dotenv import load_dotenv
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Bot, Chat, Message, Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.constants import ParseMode
-from telegram.error import BadRequest
+from telegram.error import BadRequest, RetryAfter, TelegramError
+from telegram.request import HTTPXRequest
 from telegram.ext import ApplicationBuilder, ContextTypes, CommandHandler, MessageHandler, CallbackQueryHandler, filters
-from keep_alive import keep_alive
+import ai_client
+from ai_client import AI_ERROR_MESSAGE, ask_chatgpt, transcribe_audio
+from response_cache import cache as response_cache
+import db
+from law_catalog import catalog
+from search_index import SearchIndex, highlight
+from snapshot import law_snapshot
+from traffic_fines import schedule as fine_schedule
+import media
+import websearch
+import formatter
+import metrics
+import admission
+from admission import rate_limited
+import article_texts
+import callbacks
+import jobs
+from orchestrator import QueryOrchestrator
 
 # --- CONFIGURATION ---
 warnings.filterwarnings("ignore")
 load_dotenv()
 TOKEN = os.getenv('BOT_TOKEN')
-DB_URL = os.getenv('DATABASE_URL')
-OPENAI_KEY = os.getenv('OPENAI_API_KEY')
+CONCURRENT_UPDATES = int(os.getenv('BOT_CONCURRENT_UPDATES', '64'))
+BOT_MODE = os.getenv('BOT_MODE', 'polling')  # 'polling', 'webhook' or 'worker'
+# Telegram rejects rapid edits of one message, so stream updates are spaced out
+STREAM_EDIT_INTERVAL = float(os.getenv('STREAM_EDIT_INTERVAL', '1.5'))
+# 0: start answering at once from the DB fallbacks and load the catalog in the background
+PRELOAD_CATALOG = os.getenv('PRELOAD_CATALOG', '1') == '1'
+# Navigation keyboards show one page at a time, however large a law code grows
+SECTIONS_PER_PAGE = int(os.getenv('SECTIONS_PER_PAGE', '10'))
+ARTICLES_PER_PAGE = int(os.getenv('ARTICLES_PER_PAGE', '24'))
 
 # Logging
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.ERROR)
+# LOG_JSON=1: one JSON line per update with its correlation id and stage timings
+metrics.setup_logging()
 
-client = OpenAI(api_key=OPENAI_KEY)
-
-# --- DATABASE POOL (SECURE) ---
-try:
-    db_pool = psycopg2.pool.ThreadedConnectionPool(1, 20, DB_URL, sslmode='require')
-    if db_pool:
-        print("✅ Database pool created successfully")
-except Exception as e:
-    print(f"❌ Database connection error: {e}")
-    db_pool = None
-
-def get_db_connection():
+# --- HELPER: SEND MESSAGE SAFELY ---
+# formatter បំលែងអត្ថបទទៅជា HTML ត្រឹមត្រូវ និងកាត់ជាសារ ≤ 4096 តួអក្សរ ដូច្នេះផ្ញើម្តងគឺជោគជ័យ
+async def send_html(bot, chat_id, html, reply_markup=None):
     try:
-        return db_pool.getconn()
-    except Exception as e:
-        print(f"Error getting connection: {e}")
-        return None
-
-def return_db_connection(conn):
-    if conn and db_pool:
-        db_pool.putconn(conn)
+        await bot.send_message(chat_id=chat_id, text=html, parse_mode=ParseMode.HTML, reply_markup=reply_markup)
+    except BadRequest as e:
+        # Not expected (bench_formatter.py fuzzes the output); keep the reply rather than lose it
+        print(f"Format Error: {e}")
+        await bot.send_message(chat_id=chat_id, text=formatter.strip_tags(html), reply_markup=reply_markup)
 
-# --- HELPER: SEND MESSAGE SAFELY ---
-# មុខងារនេះសំខាន់បំផុត! វាជួយការពារមិនឱ្យ Bot គាំងពេលមានបញ្ហា Format
 async def safe_send_message(context, chat_id, text, reply_markup=None):
-    try:
-        # ព្យាយាមផ្ញើជា MarkdownV2 (ដើម្បីអក្សរដិត)
-        escaped_text = escape_markdown(text)
-        await context.bot.send_message(chat_id=chat_id, text=escaped_text, parse_mode=ParseMode.MARKDOWN_V2, reply_markup=reply_markup)
-    except BadRequest:
-        try:
-            # បើបរាជ័យ ផ្ញើជា HTML
-            await context.bot.send_message(chat_id=chat_id, text=text, parse_mode=ParseMode.HTML, reply_markup=reply_markup)
-        except BadRequest:
-            # បើនៅតែបរាជ័យ ផ្ញើជាអក្សរសុទ្ធ (អត់ Format)
-            await context.bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup)
+    """Send text as one or more HTML messages; the keyboard goes on the last one."""
+    chunks = formatter.render(text)
+    for i, chunk in enumerate(chunks):
+        await send_html(context.bot, chat_id, chunk, reply_markup if i == len(chunks) - 1 else None)
 
 async def safe_edit_message(query, text, reply_markup=None):
+    """Edit the message with the first chunk of text; any further chunks follow as new messages."""
+    # query អាចជា CallbackQuery ឬ Message (សារ Status)
+    edit = getattr(query, 'edit_message_text', None) or query.edit_text
+    chunks = formatter.render(text)
+    first_markup = reply_markup if len(chunks) == 1 else None
     try:
-        # ព្យាយាមផ្ញើជា HTML ជាមុនសិន (សុវត្ថិភាពជាងគេសម្រាប់ Menu)
-        await query.edit_message_text(text=text, parse_mode=ParseMode.HTML, reply_markup=reply_markup)
-    except BadRequest:
+        await edit(text=chunks[0], parse_mode=ParseMode.HTML, reply_markup=first_markup)
+    except BadRequest as e:
+        if 'not modified' not in str(e):
+            print(f"Format Error: {e}")
+            await edit(text=formatter.strip_tags(chunks[0]), reply_markup=first_markup)
+    message = getattr(query, 'message', query)
+    for i, chunk in enumerate(chunks[1:], 2):
+        await send_html(message.get_bot(), message.chat_id, chunk, reply_markup if i == len(chunks) else None)
+
+class StreamEditor:
+    """on_progress callback for ask_chatgpt: shows partial AI output in a status message,
+    editing at most once per STREAM_EDIT_INTERVAL. The caller sends the final, formatted text."""
+    def __init__(self, message, prefix=""):
+        self.message = message
+        self.prefix = prefix
+        self.last_edit = 0.0
+
+    async def __call__(self, text):
+        now = time.monotonic()
+        if now - self.last_edit < STREAM_EDIT_INTERVAL:
+            return
+        self.last_edit = now
+        preview = self.prefix + text
+        if len(preview) > formatter.MAX_MESSAGE_LENGTH - 96:
+            preview = preview[:formatter.MAX_MESSAGE_LENGTH - 96] + "…"
         try:
-            # បើបរាជ័យ ព្យាយាម Escape ហើយផ្ញើជា MarkdownV2
-            escaped_text = escape_markdown(text)
-            await query.edit_message_text(text=escaped_text, parse_mode=ParseMode.MARKDOWN_V2, reply_markup=reply_markup)
-        except BadRequest:
-            # បើនៅតែបរាជ័យ ផ្ញើជាអក្សរសុទ្ធ
-            await query.edit_message_text(text=text, reply_markup=reply_markup)
-
-def escape_markdown(text):
-    """Escape special chars for MarkdownV2"""
-    if not text: return ""
-    text = str(text)
-    escape_chars = r'_*[]()~`>#+-=|{}.!'
-    return re.sub(f'([{re.escape(escape_chars)}])', r'\\\1', text)
+            # Plain text while streaming: half-finished markup would be rejected
+            await self.message.edit_text(preview + " ▌")
+        except RetryAfter as e:
+            # Flood control: hold back the next edit instead of failing the answer
+            delay = e.retry_after
+            self.last_edit = now + (delay.total_seconds() if hasattr(delay, 'total_seconds') else delay)
+        except TelegramError as e:
+            # A lost preview edit is harmless; the final text is sent separately
+            if not isinstance(e, BadRequest):
+                print(f"Stream Edit Error: {e}")
 
 # --- AI CORE FUNCTIONS ---
 
-def ask_chatgpt(messages, temperature=0.7):
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            temperature=temperature
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        print(f"OpenAI Error: {e}")
-        return "⚠️ AI មានបញ្ហាបច្ចេកទេស។"
-
-def transcribe_audio(file_path):
-    try:
-        with open(file_path, "rb") as audio_file:
-            transcript = client.audio.transcriptions.create(
-                model="whisper-1", 
-                file=audio_file,
-                language="km"
-            )
-        return transcript.text
-    except Exception as e:
-        print(f"Whisper Error: {e}")
-        return None
-
-def translate_text(text):
+@metrics.timed('ai.translate')
+async def translate_text(text):
     prompt = f"Translate the following legal text into formal Khmer. Maintain legal terminology:\n\n'{text}'"
-    return ask_chatgpt([{"role": "user", "content": prompt}], temperature=0.3)
+    return await ask_chatgpt([{"role": "user", "content": prompt}], temperature=0.3, feature='translate')
 
-def search_web_and_solve(user_question):
-    results = []
-    try:
-        with DDGS() as ddgs:
-            results = list(ddgs.text(f"{user_question} ច្បាប់កម្ពុជា", region='wt-wt', safesearch='off', max_results=2))
-    except Exception as e:
-        print(f"Search Error: {e}")
-    
+async def web_search(user_question):
+    # Cached, circuit-broken and run off the event loop; see websearch.py
+    return await websearch.searcher.search(user_question)
+
+@metrics.timed('ai.web_qa')
+async def answer_with_web(user_question, results, on_progress=None):
     context = "\n".join([r['body'] for r in results]) if results else "No web results."
     messages = [
         {"role": "system", "content": "You are a Cambodian Law Expert. Answer in KHMER. Keep it short."},
         {"role": "user", "content": f"Context: {context}\n\nQuestion: {user_question}"}
     ]
-    return ask_chatgpt(messages)
+    return await ask_chatgpt(messages, feature='web_qa', on_progress=on_progress)
 
-def calculate_traffic_fine(violation_text):
+async def semantic_search(user_question):
+    try:
+        with metrics.timer('search.semantic'):
+            return await get_services().semantic_index.search(user_question)
+    except Exception as e:
+        print(f"Semantic Search Error: {e}")
+        return []
+
+@metrics.timed('ai.rag_qa')
+async def answer_with_articles(user_question, hits, on_progress=None):
+    """RAG: answer from our own articles with citations."""
+    context = "\n\n".join(f"[{i}] {title} ({law_code})\n{chunk}" for i, (_, title, law_code, chunk, _) in enumerate(hits, 1))
+    messages = [
+        {"role": "system", "content": "You are a Cambodian Law Expert. Answer in KHMER using only the numbered law articles given. Cite the articles you use like [1]. If they do not cover the question, say so. Keep it short."},
+        {"role": "user", "content": f"Law articles:\n{context}\n\nQuestion: {user_question}"}
+    ]
+    answer = await ask_chatgpt(messages, feature='rag_qa', on_progress=on_progress)
+    sources = "\n".join(f"[{i}] {title}" for i, (_, title, _, _, _) in enumerate(hits, 1))
+    return f"{answer}\n\n📚 ប្រភព៖\n{sources}"
+
+async def refresh_semantic_index(changes=None):
+    services = get_services()
+    semantic_index = services.semantic_index
+    # One at a time and in reload order: each incremental update builds on the last
+    async with services.semantic_lock:
+        try:
+            if law_snapshot is not None and law_snapshot.loaded:
+                # Embeddings ship in the same file as the articles
+                semantic_index.load(law_snapshot.embeddings())
+                print(f"🧠 Semantic index: {len(semantic_index.meta)} chunks")
+            elif changes and len(semantic_index):
+                await semantic_index.apply_changes(changes['upserted'], changes['deleted'])
+            else:
+                await semantic_index.refresh()
+        except Exception as e:
+            print(f"Semantic Index Error: {e}")
+
+@metrics.timed('ai.fine')
+async def calculate_traffic_fine(violation_text):
     prompt = f"Calculate traffic fine in Riel for: '{violation_text}' based on Cambodia Sub-decree No. 39. Answer in Khmer only."
-    return ask_chatgpt([{"role": "user", "content": prompt}])
+    return await ask_chatgpt([{"role": "user", "content": prompt}], feature='fine')
 
-def analyze_photo(photo_base64):
+@metrics.timed('ai.photo')
+async def analyze_photo(photo_base64):
     messages = [{
         "role": "user",
         "content": [
@@ -140,78 +179,156 @@ def analyze_photo(photo_base64):
             {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{photo_base64}"}}
         ]
     }]
-    return ask_chatgpt(messages)
+    return await ask_chatgpt(messages)
 
-def generate_legal_document(doc_type):
+@metrics.timed('ai.document')
+async def generate_legal_document(doc_type, on_progress=None):
     prompt = f"សរសេរគំរូ '{doc_type}' ជាភាសាខ្មែរផ្លូវការ។"
-    return ask_chatgpt([{"role": "user", "content": prompt}], temperature=0.3)
+    return await ask_chatgpt([{"role": "user", "content": prompt}], temperature=0.3, feature='document', on_progress=on_progress)
 
-def explain_legal_text(legal_text):
-    prompt = f"Explain this law article in simple Khmer: '{legal_text}'"
-    return ask_chatgpt([{"role": "user", "content": prompt}])
+@metrics.timed('ai.explain')
+async def explain_article(article_id, kind, title, content, on_progress=None):
+    """Explain or translate an article live and keep the answer for the next reader."""
+    text = await article_texts.generate(kind, title, content, on_progress)
+    if text != AI_ERROR_MESSAGE:
+        await article_texts.store(article_id, kind, title, content, text)
+    return text
 
 # --- DATABASE FUNCTIONS ---
-
-def get_sections(law_code):
-    conn = get_db_connection()
-    if not conn: return []
+# Navigation reads come from the in-memory catalog; the SQLite snapshot
+# (LAW_SOURCE=snapshot) or the DB is only a fallback for when the catalog
+# could not be loaded at startup.
+
+@metrics.timed('db.get_sections')
+async def get_sections(law_code):
+    """[(section_id, section)] in menu order; a section's id is its smallest article id."""
+    if catalog.loaded:
+        return catalog.get_section_list(law_code)
+    if law_snapshot is not None and law_snapshot.loaded:
+        return law_snapshot.get_sections(law_code)
     try:
-        cur = conn.cursor()
-        cur.execute("SELECT DISTINCT section FROM law_articles WHERE law_code = %s ORDER BY section", (law_code,))
-        results = cur.fetchall()
-        cur.close()
-        return [r[0] for r in results]
+        return await db.fetch("SELECT MIN(id), section FROM law_articles WHERE law_code = $1 GROUP BY section ORDER BY section", law_code)
     except Exception as e:
         print(f"DB Error: {e}")
         return []
-    finally:
-        return_db_connection(conn)
 
-def get_articles_by_section(law_code, section_name):
-    conn = get_db_connection()
-    if not conn: return []
+@metrics.timed('db.get_section')
+async def get_section(section_id):
+    """(law_code, section) for a section id, or None."""
+    if catalog.loaded:
+        return catalog.get_section(section_id)
+    if law_snapshot is not None and law_snapshot.loaded:
+        return law_snapshot.get_section(section_id)
     try:
-        cur = conn.cursor()
-        cur.execute("SELECT id, article_title FROM law_articles WHERE law_code = %s AND section = %s ORDER BY id", (law_code, section_name))
-        results = cur.fetchall()
-        cur.close()
-        return results
+        return await db.fetchrow("SELECT law_code, section FROM law_articles WHERE id = $1", section_id)
+    except Exception as e:
+        print(f"DB Error: {e}")
+        return None
+
+@metrics.timed('db.get_section_id')
+async def get_section_id(law_code, section_name):
+    if catalog.loaded:
+        return catalog.get_section_id(law_code, section_name)
+    if law_snapshot is not None and law_snapshot.loaded:
+        return law_snapshot.get_section_id(law_code, section_name)
+    try:
+        row = await db.fetchrow("SELECT MIN(id) FROM law_articles WHERE law_code = $1 AND section = $2", law_code, section_name)
+        return row[0] if row else None
+    except Exception as e:
+        print(f"DB Error: {e}")
+        return None
+
+@metrics.timed('db.get_articles_by_section')
+async def get_articles_by_section(law_code, section_name):
+    if catalog.loaded:
+        return catalog.get_articles_by_section(law_code, section_name)
+    if law_snapshot is not None and law_snapshot.loaded:
+        return law_snapshot.get_articles_by_section(law_code, section_name)
+    try:
+        return await db.fetch("SELECT id, article_title FROM law_articles WHERE law_code = $1 AND section = $2 ORDER BY id", law_code, section_name)
     except Exception as e:
         print(f"DB Error: {e}")
         return []
-    finally:
-        return_db_connection(conn)
 
-def get_content(article_id):
-    conn = get_db_connection()
-    if not conn: return None
+@metrics.timed('db.get_content')
+async def get_content(article_id):
+    if catalog.loaded:
+        return catalog.get_content(int(article_id))
+    if law_snapshot is not None and law_snapshot.loaded:
+        return law_snapshot.get_content(int(article_id))
     try:
-        cur = conn.cursor()
-        cur.execute("SELECT article_title, content, section, law_code FROM law_articles WHERE id = %s", (article_id,))
-        result = cur.fetchone()
-        cur.close()
-        return result
+        return await db.fetchrow("SELECT article_title, content, section, law_code FROM law_articles WHERE id = $1", int(article_id))
     except Exception as e:
         print(f"DB Error: {e}")
         return None
-    finally:
-        return_db_connection(conn)
 
-def check_database_first(user_text):
-    conn = get_db_connection()
-    if not conn: return None
+@metrics.timed('db.check_database_first')
+async def check_database_first(user_text, k=4):
+    """Return up to k ranked (article_id, title, snippet, coverage) hits for the user's question."""
+    search_index = get_services().search_index
+    # Until the first index build finishes (PRELOAD_CATALOG=0), use the SQL fallback
+    if catalog.loaded and search_index.version:
+        results = []
+        for hit in search_index.search(user_text, k=k):
+            article = catalog.get_content(hit.article_id)
+            if article is None:
+                # Deleted in a reload whose index is still being rebuilt
+                continue
+            title, content, _, _ = article
+            # Whole article with the matched words in bold; long ones are split when sent
+            results.append((hit.article_id, title, highlight(content, user_text, width=len(content), start_tag='<b>', end_tag='</b>'), hit.coverage))
+        return results
+    if law_snapshot is not None and law_snapshot.loaded:
+        return [(art_id, title, highlight(content, user_text, width=len(content), start_tag='<b>', end_tag='</b>'), coverage)
+                for art_id, title, content, coverage in law_snapshot.search(user_text, k=k)]
     try:
-        cur = conn.cursor()
         search_term = f"%{user_text[:20]}%"
-        cur.execute("SELECT article_title, content FROM law_articles WHERE article_title ILIKE %s OR content ILIKE %s LIMIT 1", (search_term, search_term))
-        result = cur.fetchone()
-        cur.close()
-        return result
+        row = await db.fetchrow("SELECT id, article_title, content FROM law_articles WHERE article_title ILIKE $1 OR content ILIKE $1 LIMIT 1", search_term)
+        # A literal substring match counts as a confident hit
+        return [(*row, 1.0)] if row else []
     except Exception as e:
         print(f"DB Error: {e}")
-        return None
-    finally:
-        return_db_connection(conn)
+        return []
+
+# --- SERVICES ---
+# Built on first use, normally by start_services() before the first update, so that
+# importing main (tests, benchmarks, the job worker) does not pull in numpy or the embedder.
+
+class Services:
+    def __init__(self):
+        from semantic_search import VectorIndex, get_embedder
+        self.search_index = SearchIndex()
+        self.semantic_index = VectorIndex(get_embedder())
+        # Keyword, semantic and web lookups run side by side; see orchestrator.py
+        self.orchestrator = QueryOrchestrator(check_database_first, semantic_search, web_search, answer_with_articles, answer_with_web)
+        self.index_task = None
+        # Semantic refreshes in flight; kept so they aren't garbage-collected
+        self.semantic_tasks = set()
+        self.semantic_lock = asyncio.Lock()
+        catalog.on_reload(self.rebuild_search_index)
+        # Embeddings are written by the same import that bumps the catalog
+        catalog.on_reload(self.refresh_semantic_index)
+        if catalog.loaded:
+            self.search_index.build(catalog.articles, catalog.version)
+
+    def rebuild_search_index(self, cat):
+        # Built a batch at a time, so a reload never stalls the updates in flight
+        if self.index_task is not None:
+            self.index_task.cancel()
+        self.index_task = asyncio.get_running_loop().create_task(self.search_index.build_async(cat.articles, cat.version))
+
+    def refresh_semantic_index(self, cat):
+        task = asyncio.get_running_loop().create_task(refresh_semantic_index(cat.last_changes))
+        self.semantic_tasks.add(task)
+        task.add_done_callback(self.semantic_tasks.discard)
+
+_services = None
+
+def get_services():
+    global _services
+    if _services is None:
+        _services = Services()
+    return _services
 
 # --- MENUS ---
 def main_menu():
@@ -221,15 +338,41 @@ def main_menu():
         [InlineKeyboardButton("🧮 គណនាពិន័យ", callback_data='tool_calc'),
          InlineKeyboardButton("📝 បង្កើតលិខិត", callback_data='menu_gen')],
         [InlineKeyboardButton("🗣️ បកប្រែ (Translate)", callback_data='tool_translate')],
-        [InlineKeyboardButton("📘 ក្រមព្រហ្មទណ្ឌ", callback_data='code_criminal'),
-         InlineKeyboardButton("🛵 ច្បាប់ចរាចរណ៍", callback_data='code_traffic')],
+        [InlineKeyboardButton("📘 ក្រមព្រហ្មទណ្ឌ", callback_data=callbacks.encode('code', 'criminal')),
+         InlineKeyboardButton("🛵 ច្បាប់ចរាចរណ៍", callback_data=callbacks.encode('code', 'traffic'))],
         [InlineKeyboardButton("📍 រកសមត្ថកិច្ច", callback_data='info_location')]
     ]
     return InlineKeyboardMarkup(keyboard)
 
+STALE_MENU_MESSAGE = "⚠️ ម៉ឺនុយនេះហួសសម័យហើយ។ សូមជ្រើសរើសម្តងទៀត៖"
+
 def back_to_main_menu():
     return InlineKeyboardMarkup([[InlineKeyboardButton("🔙 ត្រឡប់ទៅម៉ឺនុយដើម", callback_data='main')]])
 
+def article_buttons(hits):
+    """Shortcut buttons to ranked article hits, then the way back."""
+    keyboard = [[InlineKeyboardButton(f"📄 {title.split(':')[0]}", callback_data=callbacks.encode('article', art_id))] for art_id, title, _, _ in hits]
+    keyboard.append([InlineKeyboardButton("🔙 ត្រឡប់ទៅម៉ឺនុយដើម", callback_data='main')])
+    return InlineKeyboardMarkup(keyboard)
+
+def page_slice(items, page, per_page):
+    """(items on this page, clamped page, page count)."""
+    pages = max(1, -(-len(items) // per_page))
+    page = min(max(page, 0), pages - 1)
+    return items[page * per_page:(page + 1) * per_page], page, pages
+
+def page_buttons(action, key, page, pages):
+    """◀️ / ▶️ row for a paged keyboard, empty when everything fits on one page."""
+    row = []
+    if page > 0:
+        row.append(InlineKeyboardButton("◀️", callback_data=callbacks.encode(action, key, page - 1)))
+    if page < pages - 1:
+        row.append(InlineKeyboardButton("▶️", callback_data=callbacks.encode(action, key, page + 1)))
+    return [row] if row else []
+
+def page_label(page, pages):
+    return f" ({page + 1}/{pages})" if pages > 1 else ""
+
 def generator_menu():
     keyboard = [
         [InlineKeyboardButton("📄 ពាក្យបណ្តឹង", callback_data='gen_complaint')],
@@ -240,6 +383,7 @@ def generator_menu():
 
 # --- HANDLERS ---
 
+@metrics.handler('start')
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data['mode'] = None
     user = update.effective_user.first_name
@@ -248,104 +392,82 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "ខ្ញុំអាចជួយដោះស្រាយបញ្ហាផ្លូវច្បាប់, គណនាប្រាក់ពិន័យ, និងផ្តល់យោបល់បាន។\n\n"
         "👇 <b>សូមជ្រើសរើសសេវាកម្ម៖</b>"
     )
-    # ប្រើ safe_send_message
-    try:
-        await context.bot.send_message(chat_id=update.effective_chat.id, text=welcome_text, reply_markup=main_menu(), parse_mode=ParseMode.HTML)
-    except:
-        await context.bot.send_message(chat_id=update.effective_chat.id, text=welcome_text.replace("<b>", "").replace("</b>", ""), reply_markup=main_menu())
+    # ប្រើ safe_send_message (ឈ្មោះអ្នកប្រើអាចមានតួអក្សរ < ឬ &)
+    await safe_send_message(context, update.effective_chat.id, welcome_text, main_menu())
 
+@metrics.handler('voice')
+@rate_limited('voice')
 async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    status_msg = await update.message.reply_text("🎧 កំពុងស្តាប់...")
-    unique_filename = f"voice_{uuid.uuid4()}.ogg"
-    
-    try:
-        voice_file = await context.bot.get_file(update.message.voice.file_id)
-        await voice_file.download_to_drive(unique_filename)
-        
-        text_query = transcribe_audio(unique_filename)
-        if not text_query:
-            await context.bot.edit_message_text("❌ ស្តាប់មិនច្បាស់។", chat_id=update.effective_chat.id, message_id=status_msg.message_id)
-            return
-
-        await context.bot.edit_message_text(f"🗣️ \"{text_query}\"\n\n🤖 កំពុងគិត...", chat_id=update.effective_chat.id, message_id=status_msg.message_id)
-        
-        answer = search_web_and_solve(text_query)
-        await safe_send_message(context, update.effective_chat.id, f"🤖 *ចម្លើយ AI៖*\n\n{answer}", back_to_main_menu())
-
-    except Exception as e:
-        print(f"Voice Error: {e}")
-        await context.bot.send_message(chat_id=update.effective_chat.id, text="⚠️ មានបញ្ហាបច្ចេកទេស។")
-    finally:
-        if os.path.exists(unique_filename): 
-            try: os.remove(unique_filename)
-            except: pass
+    voice = update.message.voice
+    await enqueue_job(update, context, 'voice', {'file_id': voice.file_id, 'file_size': voice.file_size}, "🎧 កំពុងស្តាប់...")
 
+@metrics.handler('photo')
+@rate_limited('photo')
 async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    status = await update.message.reply_text("📸 កំពុងវិភាគ...")
-    unique_filename = f"temp_{uuid.uuid4()}.jpg"
-    try:
-        photo_file = await context.bot.get_file(update.message.photo[-1].file_id)
-        await photo_file.download_to_drive(unique_filename)
-        with open(unique_filename, "rb") as image_file:
-            base64_image = base64.b64encode(image_file.read()).decode('utf-8')
-        
-        answer = analyze_photo(base64_image)
-        await context.bot.delete_message(chat_id=update.effective_chat.id, message_id=status.message_id)
-        await safe_send_message(context, update.effective_chat.id, f"🤖 *លទ្ធផល៖*\n\n{answer}", back_to_main_menu())
-
-    except Exception as e:
-        print(f"Photo Error: {e}")
-        await context.bot.edit_message_text("❌ មានបញ្ហារូបភាព", chat_id=update.effective_chat.id, message_id=status.message_id)
-    finally:
-        if os.path.exists(unique_filename): 
-            try: os.remove(unique_filename)
-            except: pass
+    photo = media.pick_photo_size(update.message.photo)
+    payload = {'file_id': photo.file_id, 'memory': media.image_memory_estimate(photo)}
+    await enqueue_job(update, context, 'photo', payload, "📸 កំពុងវិភាគ...")
 
+@metrics.handler('location')
 async def handle_location(update: Update, context: ContextTypes.DEFAULT_TYPE):
     lat = update.message.location.latitude
     lng = update.message.location.longitude
     maps_url = f"https://www.google.com/maps/search/police+station+near+me/@{lat},{lng},15z"
     await update.message.reply_text(f"📍 <a href='{maps_url}'>មើលទីតាំងលើផែនទី</a>", parse_mode=ParseMode.HTML, reply_markup=back_to_main_menu())
 
+@metrics.handler('text')
 async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_text = update.message.text
     mode = context.user_data.get('mode')
 
     try:
         if mode == 'calc':
-            processing = await update.message.reply_text("🧮 កំពុងគណនា...")
-            result = calculate_traffic_fine(user_text)
-            await context.bot.delete_message(chat_id=update.effective_chat.id, message_id=processing.message_id)
+            # Known violations are answered straight from the Sub-decree 39 table
+            result = fine_schedule.calculate(user_text)
+            if result:
+                await safe_send_message(context, update.effective_chat.id, result, back_to_main_menu())
+                context.user_data['mode'] = None
+                return
+            async with admission.controller.admit(update.effective_user.id, 'ai_text'):
+                processing = await update.message.reply_text("🧮 កំពុងគណនា...")
+                result = await calculate_traffic_fine(user_text)
+                await context.bot.delete_message(chat_id=update.effective_chat.id, message_id=processing.message_id)
             await safe_send_message(context, update.effective_chat.id, result, back_to_main_menu())
             context.user_data['mode'] = None 
             return
 
         if mode == 'translate':
-            processing = await update.message.reply_text("📝 កំពុងបកប្រែ...")
-            result = translate_text(user_text)
-            await context.bot.delete_message(chat_id=update.effective_chat.id, message_id=processing.message_id)
+            async with admission.controller.admit(update.effective_user.id, 'translate'):
+                processing = await update.message.reply_text("📝 កំពុងបកប្រែ...")
+                result = await translate_text(user_text)
+                await context.bot.delete_message(chat_id=update.effective_chat.id, message_id=processing.message_id)
             await safe_send_message(context, update.effective_chat.id, f"📝 *លទ្ធផល៖*\n\n{result}", back_to_main_menu())
             context.user_data['mode'] = None
             return
 
         status_msg = await update.message.reply_text("🔍 កំពុងស្វែងរក...")
         
-        db_result = check_database_first(user_text)
-        
-        if db_result:
-            title, content = db_result
-            safe_content = content[:3000] + "..." if len(content) > 3000 else content
+        result = await get_services().orchestrator.run(
+            user_text, StreamEditor(status_msg),
+            admit=lambda: admission.controller.admit(update.effective_user.id, 'ai_text'))
+
+        if result.kind == 'article':
+            _, title, content, _ = result.hits[0]
+            # Other ranked matches become shortcuts to their articles
             await context.bot.delete_message(chat_id=update.effective_chat.id, message_id=status_msg.message_id)
-            await safe_send_message(context, update.effective_chat.id, f"📚 *ឯកសារច្បាប់៖*\n\n*{title}*\n{safe_content}", back_to_main_menu())
+            await safe_send_message(context, update.effective_chat.id, f"📚 *ឯកសារច្បាប់៖*\n\n*{title}*\n{content}", article_buttons(result.hits[1:]))
         else:
-            answer = search_web_and_solve(user_text)
-            await context.bot.delete_message(chat_id=update.effective_chat.id, message_id=status_msg.message_id)
-            await safe_send_message(context, update.effective_chat.id, f"🤖 *ចម្លើយ AI៖*\n\n{answer}", back_to_main_menu())
-            
+            # Weaker keyword matches are still offered under the AI answer
+            await safe_edit_message(status_msg, f"🤖 *ចម្លើយ AI៖*\n\n{result.text}", article_buttons(result.hits))
+
+
+    except admission.Rejected as e:
+        await update.message.reply_text(str(e), reply_markup=back_to_main_menu())
     except Exception as e:
         print(f"Text Handler Error: {e}")
         await context.bot.send_message(chat_id=update.effective_chat.id, text="⚠️ មានបញ្ហាបច្ចេកទេស។")
 
+@metrics.handler('navigation')
 async def handle_navigation(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -386,80 +508,301 @@ async def handle_navigation(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         elif data.startswith('gen_'):
             doc_map = {'gen_complaint': 'ពាក្យបណ្តឹង', 'gen_loan': 'កិច្ចសន្យាខ្ចីប្រាក់'}
-            doc_type = doc_map.get(data)
-            await query.edit_message_text(f"⏳ កំពុងសរសេរ...", parse_mode=None)
-            doc_content = generate_legal_document(doc_type)
-            await query.message.delete()
-            # Send plain text for documents to avoid format errors
-            await context.bot.send_message(chat_id=update.effective_chat.id, text=f"{doc_content}", reply_markup=back_to_main_menu())
-
-        elif data.startswith('explain|'):
-            article_id = data.split('|')[1]
-            result = get_content(article_id)
-            if result:
-                title, content, _, _ = result
-                await safe_edit_message(query, f"💡 <b>កំពុងពន្យល់...</b>\n\n{title}")
-                explanation = explain_legal_text(f"{title}\n{content}")
-                await safe_edit_message(query, explanation, back_to_main_menu())
-
-        elif data.startswith('code_'):
-            law_code = data.split('_')[1]
-            sections = get_sections(law_code)
-            keyboard = []
-            for index, section_name in enumerate(sections):
-                short_name = section_name.split('(')[0].strip()
-                btn_text = short_name if len(short_name) < 30 else short_name[:28] + ".."
-                keyboard.append([InlineKeyboardButton(f"📂 {btn_text}", callback_data=f"sect|{law_code}|{index}")])
-            keyboard.append([InlineKeyboardButton("🔙 ត្រឡប់ទៅម៉ឺនុយដើម", callback_data="main")])
-            await safe_edit_message(query, "📖 <b>មាតិកាច្បាប់៖</b>", InlineKeyboardMarkup(keyboard))
-
-        elif data.startswith('sect|'):
-            parts = data.split('|')
-            law_code = parts[1]
-            section_index = int(parts[2])
-            
-            sections = get_sections(law_code)
-            if section_index < len(sections):
-                full_section_name = sections[section_index]
-                articles = get_articles_by_section(law_code, full_section_name)
-                keyboard = []
-                row = []
-                for art_id, art_title in articles:
-                    short_title = art_title.split(':')[0]
-                    row.append(InlineKeyboardButton(f"📄 {short_title}", callback_data=f"art|{art_id}"))
-                    if len(row) == 3: keyboard.append(row); row = []
-                if row: keyboard.append(row)
-                keyboard.append([InlineKeyboardButton("🔙 ត្រឡប់", callback_data=f"code_{law_code}")])
-                await safe_edit_message(query, f"📂 <b>{full_section_name}</b>", InlineKeyboardMarkup(keyboard))
-
-        elif data.startswith('art|'):
-            article_id = data.split('|')[1]
-            result = get_content(article_id)
-            if result:
-                title, content, section, law_code = result
-                all_secs = get_sections(law_code)
-                s_idx = all_secs.index(section) if section in all_secs else 0
-                
-                keyboard = [
-                    [InlineKeyboardButton("💡 ពន្យល់ខ្ញុំ", callback_data=f"explain|{article_id}")],
-                    [InlineKeyboardButton("🔙 ត្រឡប់", callback_data=f"sect|{law_code}|{s_idx}")]
-                ]
-                # ប្រើ safe_edit_message ដើម្បីការពារ Error
-                await safe_edit_message(query, f"*{title}*\n\n{content}", InlineKeyboardMarkup(keyboard))
+            admission.controller.check_rate(update.effective_user.id, 'document')
+            await enqueue_job(update, context, 'document', {'doc_type': doc_map.get(data)}, "⏳ កំពុងសរសេរ...", status=query.message)
+
+        else:
+            nav = callbacks.decode(data)
+            if nav is not None:
+                await handle_law_navigation(update, query, *nav)
 
+    except admission.Rejected as e:
+        await query.message.reply_text(str(e), reply_markup=back_to_main_menu())
     except Exception as e:
         print(f"Navigation Error: {e}")
         try: await query.message.reply_text("⚠️ មានកំហុស សូមព្យាយាមម្តងទៀត។", reply_markup=back_to_main_menu())
         except: pass
 
-if __name__ == '__main__':
-    keep_alive() # Start Web Server
-    application = ApplicationBuilder().token(TOKEN).build()
+async def handle_law_navigation(update, query, action, args):
+    """Law code -> section -> article menus, addressed by the ids in callbacks.py."""
+    if action == 'section_index':
+        # Keyboard sent before callbacks.py: resolve the old positional index once
+        law_code, index = args
+        sections = await get_sections(law_code)
+        action, args = 'section', [sections[index][0] if index < len(sections) else None]
+
+    if action == 'code':
+        law_code, page = args[0], (args[1] if len(args) > 1 else 0)
+        sections, page, pages = page_slice(await get_sections(law_code), page, SECTIONS_PER_PAGE)
+        keyboard = []
+        for section_id, section_name in sections:
+            short_name = section_name.split('(')[0].strip()
+            btn_text = short_name if len(short_name) < 30 else short_name[:28] + ".."
+            keyboard.append([InlineKeyboardButton(f"📂 {btn_text}", callback_data=callbacks.encode('section', section_id))])
+        keyboard += page_buttons('code', law_code, page, pages)
+        keyboard.append([InlineKeyboardButton("🔙 ត្រឡប់ទៅម៉ឺនុយដើម", callback_data="main")])
+        await safe_edit_message(query, f"📖 <b>មាតិកាច្បាប់៖</b>{page_label(page, pages)}", InlineKeyboardMarkup(keyboard))
+
+    elif action == 'section':
+        section_id, page = args[0], (args[1] if len(args) > 1 else 0)
+        found = await get_section(section_id) if section_id is not None else None
+        if not found:
+            await safe_edit_message(query, STALE_MENU_MESSAGE, main_menu())
+            return
+        law_code, full_section_name = found
+        articles, page, pages = page_slice(await get_articles_by_section(law_code, full_section_name), page, ARTICLES_PER_PAGE)
+        keyboard = []
+        row = []
+        for art_id, art_title in articles:
+            short_title = art_title.split(':')[0]
+            row.append(InlineKeyboardButton(f"📄 {short_title}", callback_data=callbacks.encode('article', art_id)))
+            if len(row) == 3: keyboard.append(row); row = []
+        if row: keyboard.append(row)
+        keyboard += page_buttons('section', section_id, page, pages)
+        back_page = catalog.section_positions.get(section_id, 0) // SECTIONS_PER_PAGE
+        keyboard.append([InlineKeyboardButton("🔙 ត្រឡប់", callback_data=callbacks.encode('code', law_code, back_page))])
+        await safe_edit_message(query, f"📂 <b>{full_section_name}</b>{page_label(page, pages)}", InlineKeyboardMarkup(keyboard))
+
+    elif action == 'article':
+        article_id = args[0]
+        result = await get_content(article_id)
+        if not result:
+            await safe_edit_message(query, STALE_MENU_MESSAGE, main_menu())
+            return
+        title, content, section, law_code = result
+        section_id = await get_section_id(law_code, section)
+        if section_id is not None:
+            back = callbacks.encode('section', section_id, catalog.article_positions.get(article_id, 0) // ARTICLES_PER_PAGE)
+        else:
+            back = callbacks.encode('code', law_code)
+        keyboard = [
+            [InlineKeyboardButton("💡 ពន្យល់ខ្ញុំ", callback_data=callbacks.encode('explain', article_id)),
+             InlineKeyboardButton("🌐 English", callback_data=callbacks.encode('translate', article_id))],
+            [InlineKeyboardButton("🔙 ត្រឡប់", callback_data=back)]
+        ]
+        # ប្រើ safe_edit_message ដើម្បីការពារ Error
+        await safe_edit_message(query, f"*{title}*\n\n{content}", InlineKeyboardMarkup(keyboard))
+
+    elif action in ('explain', 'translate'):
+        article_id = args[0]
+        kind = 'explain_km' if action == 'explain' else 'translate_en'
+        result = await get_content(article_id)
+        if result:
+            title, content, _, _ = result
+            # Normally precomputed by article_texts.py; only new or edited articles go to the AI
+            explanation = await article_texts.get(article_id, kind, title, content)
+            if explanation is None:
+                icon, status = ("💡", "កំពុងពន្យល់...") if action == 'explain' else ("🌐", "កំពុងបកប្រែ...")
+                async with admission.controller.admit(update.effective_user.id, article_texts.KINDS[kind][2]):
+                    await safe_edit_message(query, f"{icon} <b>{status}</b>\n\n{title}")
+                    explanation = await explain_article(article_id, kind, title, content, StreamEditor(query.message, f"{icon} {title}\n\n"))
+            await safe_edit_message(query, explanation, back_to_main_menu())
+
+    else:
+        # A keyboard from a callback format this version no longer reads
+        await safe_edit_message(query, STALE_MENU_MESSAGE, main_menu())
+
+# --- BACKGROUND JOBS ---
+# Voice, photo and document work runs in jobs.Workers; the handler only queues it.
+
+async def enqueue_job(update, context, kind, payload, status_text, status=None):
+    """Show a status message and queue the job that will edit it; redelivered updates are ignored."""
+    if await asyncio.to_thread(jobs.queue.seen, update.update_id):
+        return
+    if status is None:
+        status = await update.effective_message.reply_text(status_text)
+    else:
+        await status.edit_text(status_text)
+    job_id = await asyncio.to_thread(jobs.queue.enqueue, kind, update.update_id, update.effective_chat.id,
+                                     status.message_id, payload, update.effective_user.id)
+    workers = context.application.bot_data.get('job_workers')
+    if job_id is not None and workers:
+        workers.notify()
+
+def job_status_message(bot, job):
+    """The status message a job reports into, rebuilt from its ids."""
+    message = Message(job.message_id, datetime.now(timezone.utc), Chat(job.chat_id, Chat.PRIVATE))
+    message.set_bot(bot)
+    return message
+
+async def voice_job(bot, job):
+    status = job_status_message(bot, job)
+    # Audio stays in memory, and the byte budget caps how much of it is held at once
+    async with media.budget.reserve(job.payload['file_size']):
+        voice_file = await bot.get_file(job.payload['file_id'])
+        audio = await media.download_to_buffer(voice_file)
+        text_query = await transcribe_audio(audio)
+        audio.close()
+    if not text_query:
+        await status.edit_text("❌ ស្តាប់មិនច្បាស់។", reply_markup=back_to_main_menu())
+        return
+
+    heard = f"🗣️ \"{text_query}\"\n\n"
+    await status.edit_text(f"{heard}🤖 កំពុងគិត...")
+    result = await get_services().orchestrator.run(text_query, StreamEditor(status, heard), articles=False)
+    await safe_edit_message(status, f"{heard}🤖 *ចម្លើយ AI៖*\n\n{result.text}", back_to_main_menu())
+
+async def photo_job(bot, job):
+    async with media.budget.reserve(job.payload['memory']):
+        photo_file = await bot.get_file(job.payload['file_id'])
+        image = await media.download_to_buffer(photo_file)
+        # Resize/re-encode off the event loop; only the bounded JPEG is base64-encoded
+        base64_image = await asyncio.to_thread(media.encode_image, image)
+        image.close()
+    answer = await analyze_photo(base64_image)
+    if answer == AI_ERROR_MESSAGE:
+        raise jobs.Retry(answer)
+    await safe_edit_message(job_status_message(bot, job), f"🤖 *លទ្ធផល៖*\n\n{answer}", back_to_main_menu())
+
+async def document_job(bot, job):
+    status = job_status_message(bot, job)
+    doc_content = await generate_legal_document(job.payload['doc_type'], StreamEditor(status))
+    if doc_content == AI_ERROR_MESSAGE:
+        raise jobs.Retry(doc_content)
+    await safe_edit_message(status, doc_content, back_to_main_menu())
+
+JOB_HANDLERS = {'voice': voice_job, 'photo': photo_job, 'document': document_job}
+
+async def report_job_failure(bot, job, reason):
+    text = "⏳ សំណើនេះចំណាយពេលយូរពេក។ សូមព្យាយាមម្តងទៀត។" if reason == 'expired' else "⚠️ មានបញ្ហាបច្ចេកទេស។"
+    await job_status_message(bot, job).edit_text(text, reply_markup=back_to_main_menu())
+
+# --- STARTUP / SHUTDOWN ---
+# Warm-up tasks still running after start_services returned (PRELOAD_CATALOG=0)
+_background = []
+
+def load_openai_client():
+    try:
+        ai_client.get_client()
+    except Exception as e:
+        print(f"❌ OpenAI client error: {e}")
+
+def load_snapshot():
+    catalog.load(law_snapshot.articles())
+    print(f"📚 Law catalog v{catalog.version}: {len(catalog.articles)} articles from snapshot {law_snapshot.version}")
+
+async def load_catalog():
+    if law_snapshot is not None:
+        # A new export is picked up by watching the file instead of LISTEN
+        _background.append(asyncio.create_task(law_snapshot.watch(load_snapshot)))
+    try:
+        if law_snapshot is not None and law_snapshot.loaded:
+            load_snapshot()
+        else:
+            await catalog.refresh()
+        await get_services().index_task
+        if law_snapshot is None:
+            await catalog.listen(db.DB_URL)
+    except Exception as e:
+        print(f"❌ Catalog load error: {e}")
+
+async def start_services(preload_catalog=PRELOAD_CATALOG):
+    """Warm-up: do the slow first-use work before the first update is handled.
+    The OpenAI SDK import (the slowest one) runs in a thread while the search
+    services are built and the DB pool connects."""
+    openai_ready = asyncio.create_task(asyncio.to_thread(load_openai_client))
+    get_services()
+    if law_snapshot is not None and not law_snapshot.open():
+        print(f"❌ Law snapshot not found: {law_snapshot.path}")
+    try:
+        # With a snapshot the DB is only needed for writes (stored explanations)
+        if law_snapshot is None or db.DB_URL:
+            await db.init_pool()
+            if not await db.health_check():
+                print("❌ Database health check failed")
+    except Exception as e:
+        print(f"❌ Database connection error: {e}")
+        if law_snapshot is None:
+            await openai_ready
+            return
+    if not preload_catalog:
+        # Answer at once from the DB fallbacks; the catalog and index swap in when ready
+        _background[:] = [asyncio.create_task(load_catalog()), openai_ready]
+        return
+    await load_catalog()
+    await openai_ready
+
+async def stop_services():
+    for task in _background:
+        task.cancel()
+    await catalog.close()
+    await db.close_pool()
+    if law_snapshot is not None:
+        law_snapshot.close()
+
+def purge_caches():
+    """Expired AI answers and web results; run by the job workers next to the job purge."""
+    response_cache.purge_expired()
+    websearch.searcher.cache.purge_expired()
+
+async def on_startup(application):
+    await start_services()
+    if jobs.JOB_WORKERS:
+        application.bot_data['job_workers'] = jobs.Workers(application.bot, JOB_HANDLERS, report_job_failure,
+                                                           purges=[purge_caches]).start()
+
+async def on_startup_polling(application):
+    await on_startup(application)
+    # Webhook workers serve /health themselves; in polling mode run it on the bot's loop
+    from keep_alive import start_web_server
+    application.bot_data['web_runner'] = await start_web_server()
+
+async def on_shutdown(application):
+    runner = application.bot_data.pop('web_runner', None)
+    if runner:
+        await runner.cleanup()
+    workers = application.bot_data.pop('job_workers', None)
+    if workers:
+        await workers.stop()
+    await stop_services()
+
+async def run_job_workers():
+    """BOT_MODE=worker: only process queued jobs, next to a front end running with JOB_WORKERS=0."""
+    from keep_alive import start_web_server
+    bot = Bot(TOKEN, request=metrics.TimedRequest(HTTPXRequest(connection_pool_size=256)))
+    async with bot:
+        await start_services()
+        workers = jobs.Workers(bot, JOB_HANDLERS, report_job_failure, count=max(1, jobs.JOB_WORKERS),
+                               purges=[purge_caches]).start()
+        runner = await start_web_server()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+            await workers.stop()
+            await stop_services()
+
+def register_handlers(application):
     application.add_handler(CommandHandler('start', start))
     application.add_handler(MessageHandler(filters.VOICE, handle_voice))
     application.add_handler(MessageHandler(filters.PHOTO, handle_photo))
     application.add_handler(MessageHandler(filters.LOCATION, handle_location))
     application.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), handle_text))
     application.add_handler(CallbackQueryHandler(handle_navigation))
-    print("✅ DEPLOYMENT READY: Bot is running...")
-    application.run_polling()
\ No newline at end of file
+
+def build_application(polling=False, token=TOKEN, request=None):
+    # Handlers are async all the way down, so let PTB run updates side by side
+    builder = (ApplicationBuilder().token(token).concurrent_updates(CONCURRENT_UPDATES)
+               .post_init(on_startup_polling if polling else on_startup)
+               .post_shutdown(on_shutdown))
+    # Every Bot API call except the long-poll is timed as telegram.<method>
+    if request is not None:
+        builder = builder.request(metrics.TimedRequest(request)).get_updates_request(request)
+    else:
+        builder = builder.request(metrics.TimedRequest(HTTPXRequest(connection_pool_size=256)))
+    application = builder.build()
+    register_handlers(application)
+    return application
+
+if __name__ == '__main__':
+    if BOT_MODE == 'worker':
+        print("✅ DEPLOYMENT READY: Job workers are running...")
+        asyncio.run(run_job_workers())
+    elif BOT_MODE == 'webhook':
+        from webhook import run_webhook
+        print("✅ DEPLOYMENT READY: Bot is running (webhook)...")
+        run_webhook(build_application)
+    else:
+        application = build_application(polling=True)
+        print("✅ DEPLOYMENT READY: Bot is running...")
+        application.run_polling()
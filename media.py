@@ -0,0 +1,75 @@
+import asyncio
+import base64
+import io
+import os
+from contextlib import asynccontextmanager
+
+import metrics
+
+# --- CONFIGURATION ---
+MEDIA_MEMORY_BUDGET = int(os.getenv('MEDIA_MEMORY_BUDGET', str(64 * 1024 * 1024)))
+IMAGE_MAX_SIDE = int(os.getenv('MEDIA_IMAGE_MAX_SIDE', '1024'))
+IMAGE_QUALITY = int(os.getenv('MEDIA_IMAGE_QUALITY', '80'))
+DEFAULT_FILE_SIZE = 1024 * 1024  # used when Telegram doesn't tell us the size
+
+
+class ByteBudget:
+    """Semaphore counted in bytes: media handlers wait until their buffers fit in the budget."""
+
+    def __init__(self, capacity=MEDIA_MEMORY_BUDGET):
+        self.capacity = capacity
+        self.in_use = 0
+        self._condition = asyncio.Condition()
+
+    @asynccontextmanager
+    async def reserve(self, n_bytes):
+        # A single oversized file may still run, but only on its own
+        n_bytes = min(n_bytes or DEFAULT_FILE_SIZE, self.capacity)
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_use + n_bytes <= self.capacity)
+            self.in_use += n_bytes
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self.in_use -= n_bytes
+                self._condition.notify_all()
+
+
+budget = ByteBudget()
+
+metrics.collect('lawbot_media_bytes_reserved', 'Media buffer bytes currently reserved.', lambda: budget.in_use)
+
+
+async def download_to_buffer(tg_file):
+    """Download a Telegram file into memory; returns a BytesIO positioned at 0."""
+    buffer = io.BytesIO()
+    await tg_file.download_to_memory(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def pick_photo_size(photo_sizes, max_side=IMAGE_MAX_SIDE):
+    """Smallest Telegram rendition that still covers max_side, else the largest one."""
+    for size in sorted(photo_sizes, key=lambda p: p.width * p.height):
+        if max(size.width, size.height) >= max_side:
+            return size
+    return photo_sizes[-1]
+
+
+def image_memory_estimate(photo_size):
+    # Encoded file + decoded RGB bitmap while Pillow resizes it
+    return (photo_size.file_size or DEFAULT_FILE_SIZE) + photo_size.width * photo_size.height * 3
+
+
+def encode_image(buffer, max_side=IMAGE_MAX_SIDE, quality=IMAGE_QUALITY):
+    """Downscale to max_side and re-encode as JPEG; returns the base64 string for a data URL."""
+    from PIL import Image
+
+    with Image.open(buffer) as image:
+        image.thumbnail((max_side, max_side))
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        out = io.BytesIO()
+        image.save(out, format='JPEG', quality=quality, optimize=True)
+    return base64.b64encode(out.getbuffer()).decode('ascii')
@@ -0,0 +1,275 @@
+"""In-process metrics in the Prometheus text format, plus JSON request logs.
+
+Stages are timed with `timer(name)` / `@timed(name)`; handlers with `@handler(name)`,
+which also binds the update's correlation id. Gauges are read at scrape time from
+callbacks registered with `collect()`.
+"""
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+from telegram.request import BaseRequest
+
+load_dotenv()
+
+# --- CONFIGURATION ---
+LOG_JSON = os.getenv('LOG_JSON', '0') == '1'
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# USD per 1M tokens (input, output); override with OPENAI_PRICE_<MODEL>=in,out
+PRICES = {
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-4o': (2.50, 10.00),
+    'text-embedding-3-small': (0.02, 0.0),
+    'text-embedding-3-large': (0.13, 0.0),
+}
+
+correlation_id = contextvars.ContextVar('correlation_id', default=None)
+_stages = contextvars.ContextVar('stages', default=None)
+request_log = logging.getLogger('lawbot.requests')
+
+
+class Histogram:
+    def __init__(self, name, help, label, buckets=BUCKETS):
+        self.name, self.help, self.label, self.buckets = name, help, label, buckets
+        self._series = {}
+
+    def observe(self, label_value, seconds):
+        series = self._series.get(label_value)
+        if series is None:
+            series = self._series[label_value] = [[0] * len(self.buckets), 0.0, 0]
+        counts = series[0]
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                counts[i] += 1
+                break
+        series[1] += seconds
+        series[2] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for value, (counts, total, count) in sorted(self._series.items()):
+            label = f'{self.label}="{value}"'
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                yield f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}'
+            yield f'{self.name}_bucket{{{label},le="+Inf"}} {count}'
+            yield f'{self.name}_sum{{{label}}} {total:.6f}'
+            yield f'{self.name}_count{{{label}}} {count}'
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values = defaultdict(float)
+
+    def inc(self, label_values=(), amount=1):
+        self._values[label_values] += amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for values, amount in sorted(self._values.items()):
+            yield f"{self.name}{_labels(self.labels, values)} {_number(amount)}"
+
+
+def _number(value):
+    """Sample value without losing precision (':g' keeps only 6 significant digits)."""
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{n}="{v}"' for n, v in zip(names, values)) + '}'
+
+
+stage_seconds = Histogram('lawbot_stage_seconds', 'Time spent per stage (DB, search, OpenAI, Telegram, handler).', 'stage')
+stage_errors = Counter('lawbot_stage_errors_total', 'Stages that ended with an exception.', ('stage',))
+updates_total = Counter('lawbot_updates_total', 'Updates handled, by handler and outcome.', ('handler', 'outcome'))
+openai_tokens = Counter('lawbot_openai_tokens_total', 'OpenAI tokens used.', ('model', 'kind'))
+openai_cost = Counter('lawbot_openai_cost_usd_total', 'Estimated OpenAI spend in USD.', ('model',))
+query_routes = Counter('lawbot_query_routes_total', 'How questions were answered: article, rag, web, deadline.', ('route',))
+_metrics = [stage_seconds, stage_errors, updates_total, openai_tokens, openai_cost, query_routes]
+_collectors = []
+
+
+def collect(name, help, fn, kind='gauge', label=None):
+    """Expose fn() at scrape time: a number, or {label value: number} when `label` is set."""
+    _collectors.append((name, help, fn, kind, label))
+
+
+def _render_collector(name, help, fn, kind, label):
+    try:
+        value = fn()
+    except Exception as e:
+        print(f"Metrics Error: {name}: {e}")
+        return
+    yield f"# HELP {name} {help}"
+    yield f"# TYPE {name} {kind}"
+    if label is None:
+        yield f"{name} {_number(value)}"
+    else:
+        for label_value, v in sorted(value.items()):
+            yield f'{name}{{{label}="{label_value}"}} {_number(v)}'
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        lines.extend(_render_collector(*collector))
+    return "\n".join(lines) + "\n"
+
+
+def observe(stage, seconds):
+    stage_seconds.observe(stage, seconds)
+    stages = _stages.get()
+    if stages is not None:
+        stages[stage] = round(stages.get(stage, 0) + seconds * 1000, 1)
+
+
+@contextmanager
+def timer(stage):
+    """Time the block as `stage`; also recorded in the current update's log line."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        stage_errors.inc((stage,))
+        raise
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def timed(stage):
+    """Decorator form of timer() for sync and async functions."""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with timer(stage):
+                    return await fn(*args, **kwargs)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with timer(stage):
+                    return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_usage(model, usage):
+    """Count tokens and estimated cost from an OpenAI `usage` object (may be None)."""
+    if usage is None:
+        return
+    prompt = getattr(usage, 'prompt_tokens', 0) or 0
+    completion = getattr(usage, 'completion_tokens', 0) or 0
+    openai_tokens.inc((model, 'prompt'), prompt)
+    openai_tokens.inc((model, 'completion'), completion)
+    price_in, price_out = _price(model)
+    openai_cost.inc((model,), (prompt * price_in + completion * price_out) / 1_000_000)
+
+
+@functools.lru_cache(maxsize=None)
+def _price(model):
+    override = os.getenv('OPENAI_PRICE_' + model.upper().replace('-', '_').replace('.', '_'))
+    if override:
+        price_in, price_out = override.split(',')
+        return float(price_in), float(price_out)
+    return PRICES.get(model, (0.0, 0.0))
+
+
+def handler(name):
+    """Handler decorator: correlation id, per-handler latency, and one JSON log line per update."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(update, context):
+            cid = correlation_id.set(f"u{update.update_id}")
+            stages = _stages.set({})
+            outcome = 'ok'
+            start = time.perf_counter()
+            try:
+                return await fn(update, context)
+            except Exception:
+                outcome = 'error'
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                stage_seconds.observe(f"handler.{name}", elapsed)
+                updates_total.inc((name, outcome))
+                if request_log.isEnabledFor(logging.INFO):
+                    user = update.effective_user
+                    request_log.info('update', extra={'fields': {
+                        'handler': name,
+                        'update_id': update.update_id,
+                        'user_id': user.id if user else None,
+                        'outcome': outcome,
+                        'duration_ms': round(elapsed * 1000, 1),
+                        'stages_ms': _stages.get(),
+                    }})
+                _stages.reset(stages)
+                correlation_id.reset(cid)
+        return wrapper
+    return decorator
+
+
+class TimedRequest(BaseRequest):
+    """Wraps the bot's BaseRequest so every Bot API call is timed as telegram.<method>."""
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    @property
+    def read_timeout(self):
+        return self.inner.read_timeout
+
+    async def initialize(self):
+        await self.inner.initialize()
+
+    async def shutdown(self):
+        await self.inner.shutdown()
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        # File downloads end in the file path, which must not become a stage name
+        method_name = 'download' if '/file/bot' in url else url.rsplit('/', 1)[-1]
+        with timer(f"telegram.{method_name}"):
+            return await self.inner.do_request(url, method, request_data, read_timeout,
+                                               write_timeout, connect_timeout, pool_timeout)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'correlation_id': correlation_id.get(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def setup_logging():
+    """With LOG_JSON=1, write one JSON line per update (and any warnings) to stderr."""
+    if not LOG_JSON:
+        return
+    stream = logging.StreamHandler()
+    stream.setFormatter(JsonFormatter())
+    root = logging.getLogger()
+    root.handlers = [stream]
+    request_log.setLevel(logging.INFO)
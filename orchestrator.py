@@ -0,0 +1,101 @@
+"""Run the corpus lookups and the web search side by side for one question.
+
+The keyword index answers in microseconds, so it runs first:
+- a confident keyword hit returns the article at once, before any paid or slow work;
+- otherwise, once admitted, the semantic index (an embedding call) and DDGS (seconds)
+  start together, and semantic hits feed a cited RAG answer (web search cancelled);
+- otherwise the web results, or whatever arrived by WEB_SEARCH_TIMEOUT, feed the LLM.
+Everything is bounded by QUERY_DEADLINE; past it the caller gets a partial answer.
+"""
+import asyncio
+import os
+import time
+from collections import namedtuple
+from contextlib import nullcontext
+
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+
+# --- CONFIGURATION ---
+QUERY_DEADLINE = float(os.getenv('QUERY_DEADLINE', '25'))
+WEB_SEARCH_TIMEOUT = float(os.getenv('WEB_SEARCH_TIMEOUT', '6'))
+# Share of the question's terms an article must cover to be shown without asking the AI
+DB_CONFIDENCE = float(os.getenv('DB_CONFIDENCE', '0.8'))
+
+DEADLINE_MESSAGE = "⏳ ការស្វែងរកចំណាយពេលយូរពេក។ សូមព្យាយាមម្តងទៀត។"
+PARTIAL_SUFFIX = "\n\n⏳ (ចម្លើយមិនពេញលេញ ដោយសារអស់ពេល)"
+
+# kind: 'article' (show hits[0]) or 'ai' (show text); hits are keyword
+# (article_id, title, snippet, coverage) tuples; partial is True past the deadline
+Answer = namedtuple('Answer', 'kind text hits partial')
+
+
+async def _result(task, timeout):
+    """The task's result if it finishes within timeout, else []; the task keeps running."""
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), timeout)
+    except Exception:
+        return []
+
+
+class QueryOrchestrator:
+    def __init__(self, keyword_search, semantic_search, web_search, answer_with_articles, answer_with_web,
+                 deadline=QUERY_DEADLINE, web_timeout=WEB_SEARCH_TIMEOUT, confidence=DB_CONFIDENCE):
+        self.keyword_search = keyword_search
+        self.semantic_search = semantic_search
+        self.web_search = web_search
+        self.answer_with_articles = answer_with_articles
+        self.answer_with_web = answer_with_web
+        self.deadline = deadline
+        self.web_timeout = web_timeout
+        self.confidence = confidence
+
+    async def run(self, question, on_progress=None, admit=None, articles=True):
+        """Answer `question`; `admit()` (an async context manager) guards everything past
+        the keyword lookup. With articles=False keyword hits are never returned as the
+        answer (voice)."""
+        start = time.monotonic()
+        remaining = lambda: max(0.0, self.deadline - (time.monotonic() - start))
+        streamed = []
+
+        async def progress(text):
+            streamed[:] = [text]
+            if on_progress is not None:
+                await on_progress(text)
+
+        hits = await self.keyword_search(question) if articles else []
+        if hits and hits[0][3] >= self.confidence:
+            metrics.query_routes.inc(('article',))
+            return Answer('article', None, hits, False)
+
+        async with admit() if admit is not None else nullcontext():
+            fan_out = time.monotonic()
+            web_remaining = lambda: min(max(0.0, self.web_timeout - (time.monotonic() - fan_out)), remaining())
+            web = asyncio.ensure_future(self.web_search(question))
+            semantic = asyncio.ensure_future(self.semantic_search(question))
+            try:
+                chunks = await _result(semantic, remaining())
+                if chunks:
+                    web.cancel()
+                    route, answer, context = 'rag', self.answer_with_articles, chunks
+                else:
+                    # Past WEB_SEARCH_TIMEOUT, answer without web context rather than keep the user waiting
+                    route, answer, context = 'web', self.answer_with_web, await _result(web, web_remaining())
+                metrics.query_routes.inc((route,))
+
+                try:
+                    text = await asyncio.wait_for(answer(question, context, progress), remaining())
+                except asyncio.TimeoutError:
+                    metrics.query_routes.inc(('deadline',))
+                    if streamed:
+                        return Answer('ai', streamed[0] + PARTIAL_SUFFIX, hits, True)
+                    if hits:
+                        return Answer('article', None, hits, True)
+                    return Answer('ai', DEADLINE_MESSAGE, hits, True)
+                return Answer('ai', text, hits, False)
+            finally:
+                web.cancel()
+                semantic.cancel()
@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+
+# --- CONFIGURATION ---
+CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '2000'))
+# Optional SQLite file shared across restarts and worker processes
+CACHE_DB_PATH = os.getenv('RESPONSE_CACHE_DB')
+
+DAY = 24 * 60 * 60
+# Seconds an answer stays valid per feature; features not listed are never cached
+FEATURE_TTLS = {
+    'explain': 90 * DAY,
+    'document': 30 * DAY,
+    'fine': 30 * DAY,
+    'translate': 30 * DAY,
+    'rag_qa': 7 * DAY,
+    'web_qa': DAY,
+}
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize(text):
+    return _WHITESPACE_RE.sub(' ', str(text)).strip().casefold()
+
+
+def make_key(feature, model, messages, temperature):
+    parts = [feature, model, f"{temperature:.2f}"]
+    for m in messages:
+        parts.append(m['role'])
+        parts.append(normalize(m['content']))
+    return hashlib.sha256("\x1f".join(parts).encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Bounded in-memory LRU with per-entry expiry, optionally backed by SQLite.
+    The LRU is read on the event loop; the SQLite tier runs in a thread."""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, db_path=CACHE_DB_PATH):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = Counter()
+        self.misses = Counter()
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS ai_responses (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)"
+            )
+            self._db.commit()
+
+    async def get(self, feature, key):
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits[feature] += 1
+                return value
+            self._entries.pop(key, None)
+        if self._db is not None:
+            row = await asyncio.to_thread(self._db_get, key, now)
+            if row:
+                self._remember(key, row[0], row[1])
+                self.hits[feature] += 1
+                return row[0]
+        self.misses[feature] += 1
+        return None
+
+    async def set(self, feature, key, value):
+        ttl = FEATURE_TTLS.get(feature)
+        if not ttl:
+            return
+        expires_at = time.time() + ttl
+        self._remember(key, value, expires_at)
+        if self._db is not None:
+            await asyncio.to_thread(self._db_set, key, value, expires_at)
+
+    def _db_get(self, key, now):
+        with self._lock:
+            return self._db.execute(
+                "SELECT value, expires_at FROM ai_responses WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+
+    def _db_set(self, key, value, expires_at):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO ai_responses (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at)
+            )
+            self._db.commit()
+
+    def _remember(self, key, value, expires_at):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def purge_expired(self):
+        now = time.time()
+        for key in [k for k, (_, exp) in list(self._entries.items()) if exp <= now]:
+            self._entries.pop(key, None)
+        if self._db is not None:
+            with self._lock:
+                self._db.execute("DELETE FROM ai_responses WHERE expires_at <= ?", (now,))
+                self._db.commit()
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'hits': dict(self.hits),
+            'misses': dict(self.misses),
+        }
+
+
+cache = ResponseCache()
+
+
+def _hit_ratio():
+    return {f: cache.hits[f] / (cache.hits[f] + cache.misses[f]) for f in cache.hits.keys() | cache.misses.keys()}
+
+
+metrics.collect('lawbot_response_cache_hits_total', 'Cached answers served.', lambda: cache.hits, kind='counter', label='feature')
+metrics.collect('lawbot_response_cache_misses_total', 'Answers not in the cache.', lambda: cache.misses, kind='counter', label='feature')
+metrics.collect('lawbot_response_cache_hit_ratio', 'Hits / lookups since start.', _hit_ratio, label='feature')
+metrics.collect('lawbot_response_cache_entries', 'Answers held in memory.', lambda: len(cache._entries))
@@ -0,0 +1,163 @@
+import asyncio
+import math
+import re
+from collections import Counter, namedtuple
+
+# --- CONFIGURATION ---
+K1 = 1.2
+B = 0.75
+TITLE_WEIGHT = 3
+MIN_COVERAGE = 0.6
+
+SearchHit = namedtuple('SearchHit', 'article_id score coverage')
+
+# Khmer block without punctuation (។ ៕ ...), plus Latin words and digits
+_RUN_RE = re.compile(r'[\u1780-\u17d3\u17dd\u17e0-\u17e9]+|[^\W_]+')
+_COENG = '\u17d2'
+
+
+def _is_khmer(ch):
+    return '\u1780' <= ch <= '\u17ff'
+
+
+def _is_dependent(ch):
+    # Vowel signs, diacritics and the coeng (subscript) marker attach to the
+    # preceding consonant instead of starting a new cluster
+    return '\u17b4' <= ch <= '\u17d3' or ch == '\u17dd'
+
+
+def _clusters(run, offset):
+    """Split a Khmer run into orthographic clusters as (text, start, end)."""
+    clusters = []
+    i = 0
+    while i < len(run):
+        j = i + 1
+        while j < len(run):
+            if run[j - 1] == _COENG or _is_dependent(run[j]):
+                j += 1
+            else:
+                break
+        clusters.append((run[i:j], offset + i, offset + j))
+        i = j
+    return clusters
+
+
+def tokenize_with_offsets(text):
+    """Khmer has no spaces between words, so Khmer runs are indexed as
+    overlapping cluster bigrams; other scripts are indexed as words."""
+    tokens = []
+    for match in _RUN_RE.finditer(text.lower()):
+        run = match.group()
+        if not _is_khmer(run[0]):
+            tokens.append((run, match.start(), match.end()))
+            continue
+        clusters = _clusters(run, match.start())
+        if len(clusters) == 1:
+            tokens.append(clusters[0])
+        for left, right in zip(clusters, clusters[1:]):
+            tokens.append((left[0] + right[0], left[1], right[2]))
+    return tokens
+
+
+def tokenize(text):
+    return [t[0] for t in tokenize_with_offsets(text)]
+
+
+class SearchIndex:
+    """BM25-ranked inverted index over law articles."""
+
+    def __init__(self):
+        self.version = 0
+        self.postings = {}
+        self.doc_lengths = {}
+        self.avg_length = 0.0
+
+    def build(self, articles, version=0):
+        """articles: {article_id: (title, content, section, law_code)}"""
+        for _ in self._build(articles, version):
+            pass
+
+    async def build_async(self, articles, version=0, batch=200):
+        """Same as build, but yields to the event loop every `batch` articles so a
+        large corpus doesn't stall the updates being handled meanwhile."""
+        for _ in self._build(articles, version, batch):
+            await asyncio.sleep(0)
+
+    def _build(self, articles, version, batch=None):
+        postings = {}
+        doc_lengths = {}
+        for i, (art_id, (title, content, _, _)) in enumerate(articles.items(), 1):
+            counts = Counter(tokenize(content))
+            for term in tokenize(title):
+                counts[term] += TITLE_WEIGHT
+            for term, tf in counts.items():
+                postings.setdefault(term, {})[art_id] = tf
+            doc_lengths[art_id] = sum(counts.values())
+            if batch and i % batch == 0:
+                yield
+        # The old index keeps answering until the new one is complete
+        self.avg_length = sum(doc_lengths.values()) / len(doc_lengths) if doc_lengths else 0.0
+        self.postings, self.doc_lengths = postings, doc_lengths
+        self.version = version
+
+    def search(self, query, k=5, min_coverage=MIN_COVERAGE):
+        terms = set(tokenize(query))
+        if not terms or not self.doc_lengths:
+            return []
+        n_docs = len(self.doc_lengths)
+        scores = Counter()
+        matched = Counter()
+        for term in terms:
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for art_id, tf in docs.items():
+                norm = K1 * (1 - B + B * self.doc_lengths[art_id] / self.avg_length)
+                scores[art_id] += idf * tf * (K1 + 1) / (tf + norm)
+                matched[art_id] += 1
+        hits = []
+        for art_id, score in scores.most_common():
+            coverage = matched[art_id] / len(terms)
+            if coverage >= min_coverage:
+                hits.append(SearchHit(art_id, score, coverage))
+                if len(hits) == k:
+                    break
+        return hits
+
+
+def highlight(text, query, width=300, start_tag='«', end_tag='»'):
+    """Return the densest `width`-char window of text with query matches marked."""
+    terms = set(tokenize(query))
+    spans = []
+    for term, start, end in tokenize_with_offsets(text):
+        if term not in terms:
+            continue
+        if spans and start <= spans[-1][1]:
+            spans[-1][1] = max(spans[-1][1], end)
+        else:
+            spans.append([start, end])
+    if not spans:
+        return text[:width] + ("..." if len(text) > width else "")
+
+    best, best_count, right = 0, 0, 0
+    for left in range(len(spans)):
+        while right < len(spans) and spans[right][1] - spans[left][0] <= width:
+            right += 1
+        if right - left > best_count:
+            best, best_count = left, right - left
+    # Slide back when the window would run past the end, so width >= len(text) keeps it all
+    window_start = max(0, min(spans[best][0] - 40, len(text) - width))
+    window_end = min(len(text), window_start + width)
+
+    parts = ["..." if window_start > 0 else ""]
+    pos = window_start
+    for start, end in spans:
+        if start < window_start or end > window_end:
+            continue
+        parts += [text[pos:start], start_tag, text[start:end], end_tag]
+        pos = end
+    parts.append(text[pos:window_end])
+    if window_end < len(text):
+        parts.append("...")
+    return "".join(parts)
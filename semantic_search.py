@@ -0,0 +1,165 @@
+import hashlib
+import os
+
+import numpy as np
+
+import ai_client
+import db
+from search_index import tokenize
+
+# --- CONFIGURATION ---
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'openai')
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'text-embedding-3-small')
+CHUNK_CHARS = int(os.getenv('RAG_CHUNK_CHARS', '600'))
+CHUNK_OVERLAP = int(os.getenv('RAG_CHUNK_OVERLAP', '100'))
+RAG_TOP_K = int(os.getenv('RAG_TOP_K', '4'))
+RAG_MIN_SCORE = float(os.getenv('RAG_MIN_SCORE', '0.35'))
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+# --- EMBEDDERS ---
+
+class OpenAIEmbedder:
+    def __init__(self, model=EMBEDDING_MODEL):
+        self.model = model
+
+    async def embed(self, texts):
+        response = await ai_client.create_embeddings(self.model, texts)
+        return _normalize(np.array([d.embedding for d in response.data], dtype=np.float32))
+
+
+class HashEmbedder:
+    """Deterministic offline embedder (hashed bag of search tokens) for tests and benchmarks."""
+
+    def __init__(self, dim=256):
+        self.dim = dim
+
+    async def embed(self, texts):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for term in tokenize(text):
+                h = int.from_bytes(hashlib.blake2b(term.encode('utf-8'), digest_size=8).digest(), 'little')
+                matrix[row, h % self.dim] += 1.0 if h >> 63 else -1.0
+        return _normalize(matrix)
+
+
+def get_embedder(backend=EMBEDDING_BACKEND):
+    if backend == 'hash':
+        return HashEmbedder()
+    return OpenAIEmbedder()
+
+
+# --- CHUNKING ---
+
+def chunk_text(text, size=CHUNK_CHARS, overlap=CHUNK_OVERLAP):
+    """Pack paragraphs into chunks of at most `size` chars; split longer paragraphs with overlap."""
+    chunks = []
+    current = ""
+    for paragraph in (p.strip() for p in text.split("\n")):
+        if not paragraph:
+            continue
+        if len(current) + len(paragraph) + 1 <= size:
+            current = f"{current}\n{paragraph}" if current else paragraph
+            continue
+        if current:
+            chunks.append(current)
+        while len(paragraph) > size:
+            chunks.append(paragraph[:size])
+            paragraph = paragraph[size - overlap:]
+        current = paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+# --- VECTOR INDEX ---
+
+_CHUNKS_QUERY = """
+    SELECT e.article_id, a.article_title, a.law_code, e.chunk, e.embedding
+    FROM law_embeddings e JOIN law_articles a ON a.id = e.article_id
+    {where}
+    ORDER BY e.article_id, e.chunk_index
+"""
+
+
+class VectorIndex:
+    """Chunk embeddings held as one normalized float32 matrix; search is a single mat-vec product."""
+
+    def __init__(self, embedder):
+        self.embedder = embedder
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.meta = []
+
+    def __len__(self):
+        return len(self.meta)
+
+    def load(self, rows):
+        """rows: (article_id, article_title, law_code, chunk, embedding bytes)"""
+        meta = [(r[0], r[1], r[2], r[3]) for r in rows]
+        if rows:
+            matrix = np.vstack([np.frombuffer(r[4], dtype=np.float32) for r in rows])
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        self.matrix, self.meta = matrix, meta
+
+    async def refresh(self):
+        rows = await db.fetch(_CHUNKS_QUERY.format(where=""))
+        self.load(rows)
+        print(f"🧠 Semantic index: {len(self.meta)} chunks")
+
+    async def apply_changes(self, upserted, deleted):
+        """Swap in the chunks of re-synced articles without reloading the whole matrix.
+        Callers must not run two refreshes at once (see main.refresh_semantic_index)."""
+        rows = []
+        if upserted:
+            rows = await db.fetch(_CHUNKS_QUERY.format(where="WHERE e.article_id = ANY($1::int[])"), upserted)
+        # After the fetch, so keep indexes the matrix it is applied to
+        drop = set(upserted) | set(deleted)
+        keep = [i for i, m in enumerate(self.meta) if m[0] not in drop]
+        if not rows:
+            self.matrix, self.meta = self.matrix[keep], [self.meta[i] for i in keep]
+            return
+        new = np.vstack([np.frombuffer(r[4], dtype=np.float32) for r in rows])
+        matrix = np.vstack([self.matrix[keep], new]) if keep else new
+        self.matrix, self.meta = matrix, [self.meta[i] for i in keep] + [(r[0], r[1], r[2], r[3]) for r in rows]
+
+    async def search(self, query, k=RAG_TOP_K, min_score=RAG_MIN_SCORE):
+        """Return up to k (article_id, title, law_code, chunk, score), best chunk per article."""
+        if not self.meta:
+            return []
+        query_vec = (await self.embedder.embed([query]))[0]
+        scores = self.matrix @ query_vec
+        # Over-fetch so several chunks of one article don't crowd out the rest
+        n = min(len(scores), k * 3)
+        top = np.argpartition(-scores, n - 1)[:n]
+        hits = []
+        seen = set()
+        for i in top[np.argsort(-scores[top])]:
+            article_id, title, law_code, chunk = self.meta[i]
+            if scores[i] < min_score or article_id in seen:
+                continue
+            seen.add(article_id)
+            hits.append((article_id, title, law_code, chunk, float(scores[i])))
+            if len(hits) == k:
+                break
+        return hits
+
+
+async def embed_articles(embedder, articles, batch_size=64):
+    """Chunk and embed [(article_id, content)]; return (article_id, chunk_index, chunk, float32 bytes) rows."""
+    pending = [
+        (article_id, i, chunk)
+        for article_id, content in articles
+        for i, chunk in enumerate(chunk_text(content))
+    ]
+    rows = []
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        vectors = await embedder.embed([chunk for _, _, chunk in batch])
+        rows += [(a, i, c, v.astype(np.float32).tobytes()) for (a, i, c), v in zip(batch, vectors)]
+    return rows
@@ -1,6 +1,8 @@
 import psycopg2
+import psycopg2.extras
 import os
 from dotenv import load_dotenv
+from import_tool import article_number
 
 load_dotenv()
 
@@ -9,6 +11,28 @@ if not db_url:
     print("❌ សូមពិនិត្យមើល .env របស់អ្នកម្តងទៀត (ខ្វះ DATABASE_URL)")
     exit()
 
+def backfill_article_no(cur):
+    """Rows from the old importer have no article_no, so upserts never match them.
+    Number them like import_tool does and drop the duplicates that re-imports left:
+    per (law_code, article_no) keep an already-numbered row, else the newest one."""
+    cur.execute("SELECT id, law_code, article_title, article_no FROM law_articles")
+    rows = cur.fetchall()
+    if all(no is not None for _, _, _, no in rows):
+        return
+    keep = {}
+    for art_id, law_code, title, no in sorted(rows, key=lambda r: (r[3] is not None, r[0])):
+        keep[(law_code, no or article_number(title))] = (art_id, no)
+    kept_ids = {art_id for art_id, _ in keep.values()}
+    duplicates = [r[0] for r in rows if r[0] not in kept_ids]
+    if duplicates:
+        cur.execute("DELETE FROM law_articles WHERE id = ANY(%s)", (duplicates,))
+    missing = [(art_id, key[1]) for key, (art_id, no) in keep.items() if no is None]
+    psycopg2.extras.execute_values(cur, """
+        UPDATE law_articles SET article_no = v.article_no
+        FROM (VALUES %s) AS v (id, article_no) WHERE law_articles.id = v.id
+    """, missing, page_size=1000)
+    print(f"🔢 បានបំពេញលេខមាត្រា {len(missing)} ជួរ, លុបជួរស្ទួន {len(duplicates)}")
+
 try:
     # បន្ថែម sslmode='require' សម្រាប់ Cloud Database
     conn = psycopg2.connect(db_url, sslmode='require')
@@ -25,8 +49,39 @@ try:
         );
     """)
 
+    # លេខមាត្រា + Hash + Unique key សម្រាប់ Import ម្តងទៀតដោយមិនស្ទួន (upsert)
+    cur.execute("ALTER TABLE law_articles ADD COLUMN IF NOT EXISTS article_no VARCHAR(20);")
+    cur.execute("ALTER TABLE law_articles ADD COLUMN IF NOT EXISTS content_hash CHAR(64);")
+    backfill_article_no(cur)
+    cur.execute("ALTER TABLE law_articles ALTER COLUMN article_no SET NOT NULL;")
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS law_articles_code_article_no ON law_articles (law_code, article_no);")
+
+    # Table សម្រាប់ Embedding (RAG) - មួយជួរក្នុងមួយ chunk នៃមាត្រា
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS law_embeddings (
+            article_id INTEGER REFERENCES law_articles(id) ON DELETE CASCADE,
+            chunk_index INTEGER,
+            chunk TEXT,
+            embedding BYTEA,
+            PRIMARY KEY (article_id, chunk_index)
+        );
+    """)
+
+    # Table សម្រាប់ការពន្យល់/បកប្រែដែលបានបង្កើតទុកជាមុន (article_texts.py)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS law_article_texts (
+            article_id INTEGER REFERENCES law_articles(id) ON DELETE CASCADE,
+            kind VARCHAR(20),
+            content_hash CHAR(64),
+            text TEXT,
+            model VARCHAR(50),
+            created_at TIMESTAMPTZ DEFAULT now(),
+            PRIMARY KEY (article_id, kind)
+        );
+    """)
+
     conn.commit()
-    print("✅ បានបង្កើត Table 'law_articles' ជោគជ័យ!")
+    print("✅ បានបង្កើត Table 'law_articles', 'law_embeddings' និង 'law_article_texts' ជោគជ័យ!")
     cur.close()
     conn.close()
 except Exception as e:
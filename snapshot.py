@@ -0,0 +1,220 @@
+"""Read-only SQLite snapshot of the law tables, so lookups don't depend on Postgres.
+
+Export (reads Postgres, writes a temp file and renames it into place):
+
+    python snapshot.py law_snapshot.db
+
+With LAW_SOURCE=snapshot the bot loads its catalog, keyword and semantic indexes and
+stored explanations from SNAPSHOT_PATH instead of Postgres, and swaps in a newly
+exported file within SNAPSHOT_CHECK_INTERVAL seconds. Imports and the explanations
+generated live are still written to Postgres; export again to ship them.
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import time
+
+from dotenv import load_dotenv
+
+from search_index import tokenize
+
+load_dotenv()
+
+# --- CONFIGURATION ---
+LAW_SOURCE = os.getenv('LAW_SOURCE', 'postgres')  # 'postgres' or 'snapshot'
+SNAPSHOT_PATH = os.getenv('SNAPSHOT_PATH', 'law_snapshot.db')
+SNAPSHOT_CHECK_INTERVAL = float(os.getenv('SNAPSHOT_CHECK_INTERVAL', '30'))
+
+_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE law_articles (
+    id INTEGER PRIMARY KEY, law_code TEXT, section TEXT, article_title TEXT, content TEXT
+);
+CREATE INDEX law_articles_section ON law_articles (law_code, section, id);
+CREATE TABLE law_embeddings (
+    article_id INTEGER, chunk_index INTEGER, chunk TEXT, embedding BLOB,
+    PRIMARY KEY (article_id, chunk_index)
+);
+CREATE TABLE law_article_texts (
+    article_id INTEGER, kind TEXT, content_hash TEXT, text TEXT,
+    PRIMARY KEY (article_id, kind)
+);
+-- Trigram FTS: Khmer has no spaces between words, so match on substrings
+CREATE VIRTUAL TABLE law_fts USING fts5(
+    article_title, content, content='law_articles', content_rowid='id', tokenize='trigram'
+);
+"""
+
+
+# --- EXPORT ---
+
+def write_snapshot(path, articles, embeddings=(), texts=()):
+    """Write (id, law_code, section, article_title, content) rows, (article_id, chunk_index,
+    chunk, embedding bytes) rows and (article_id, kind, content_hash, text) rows to `path`,
+    atomically. Returns the snapshot version."""
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    version = time.strftime('%Y%m%d%H%M%S', time.gmtime())
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(_SCHEMA)
+        conn.executemany("INSERT INTO law_articles VALUES (?, ?, ?, ?, ?)", articles)
+        conn.executemany("INSERT INTO law_embeddings VALUES (?, ?, ?, ?)", embeddings)
+        conn.executemany("INSERT INTO law_article_texts VALUES (?, ?, ?, ?)", texts)
+        conn.execute("INSERT INTO law_fts (law_fts) VALUES ('rebuild')")
+        count = conn.execute("SELECT COUNT(*) FROM law_articles").fetchone()[0]
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [('version', version), ('articles', str(count))])
+        conn.commit()
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    # Readers holding the old file keep reading it until they reopen
+    os.replace(tmp_path, path)
+    return version
+
+
+def export(dsn, path):
+    import psycopg2
+
+    conn = psycopg2.connect(dsn, sslmode='require')
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT id, law_code, section, article_title, content FROM law_articles ORDER BY id")
+        articles = cur.fetchall()
+        cur.execute("SELECT article_id, chunk_index, chunk, embedding FROM law_embeddings")
+        embeddings = [(a, i, c, bytes(e)) for a, i, c, e in cur.fetchall()]
+        texts = []
+        cur.execute("SELECT to_regclass('law_article_texts')")
+        if cur.fetchone()[0]:
+            cur.execute("SELECT article_id, kind, content_hash, text FROM law_article_texts")
+            texts = cur.fetchall()
+    finally:
+        conn.close()
+    version = write_snapshot(path, articles, embeddings, texts)
+    print(f"✅ Snapshot {version}: {len(articles)} មាត្រា, {len(embeddings)} chunks, {len(texts)} texts -> {path}")
+
+
+# --- READ PATH ---
+
+class LawSnapshot:
+    def __init__(self, path=SNAPSHOT_PATH):
+        self.path = path
+        self.version = None
+        self._connection = None
+        self._file_id = None
+
+    @property
+    def loaded(self):
+        return self._connection is not None
+
+    def open(self):
+        """Open the file if it is new or was replaced since the last call; True when a new
+        version was swapped in."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        file_id = (stat.st_ino, stat.st_mtime_ns)
+        if file_id == self._file_id:
+            return False
+        try:
+            connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            version = connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Snapshot Error: {e}")
+            return False
+        old, self._connection = self._connection, connection
+        self.version, self._file_id = version, file_id
+        if old is not None:
+            old.close()
+        return True
+
+    async def watch(self, on_swap, interval=SNAPSHOT_CHECK_INTERVAL):
+        """Call on_swap() whenever a new snapshot file appears. Errors (e.g. a bad export)
+        are logged and polling goes on, so the next good export is still picked up."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if self.open():
+                    on_swap()
+            except Exception as e:
+                print(f"Snapshot Error: {e}")
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection, self._file_id = None, None
+
+    def _rows(self, query, *args):
+        return self._connection.execute(query, args).fetchall()
+
+    def articles(self):
+        return self._rows("SELECT id, law_code, section, article_title, content FROM law_articles")
+
+    def embeddings(self):
+        """Rows in the shape semantic_search.VectorIndex.load expects."""
+        return self._rows("""
+            SELECT e.article_id, a.article_title, a.law_code, e.chunk, e.embedding
+            FROM law_embeddings e JOIN law_articles a ON a.id = e.article_id
+            ORDER BY e.article_id, e.chunk_index
+        """)
+
+    def get_sections(self, law_code):
+        return self._rows("SELECT MIN(id), section FROM law_articles WHERE law_code = ? GROUP BY section ORDER BY section", law_code)
+
+    def get_section(self, section_id):
+        rows = self._rows("SELECT law_code, section FROM law_articles WHERE id = ?", section_id)
+        return rows[0] if rows else None
+
+    def get_section_id(self, law_code, section):
+        return self._rows("SELECT MIN(id) FROM law_articles WHERE law_code = ? AND section = ?", law_code, section)[0][0]
+
+    def get_articles_by_section(self, law_code, section):
+        return self._rows("SELECT id, article_title FROM law_articles WHERE law_code = ? AND section = ? ORDER BY id", law_code, section)
+
+    def get_content(self, article_id):
+        rows = self._rows("SELECT article_title, content, section, law_code FROM law_articles WHERE id = ?", article_id)
+        return rows[0] if rows else None
+
+    def article_text(self, article_id, kind, content_hash):
+        rows = self._rows("SELECT text FROM law_article_texts WHERE article_id = ? AND kind = ? AND content_hash = ?",
+                          article_id, kind, content_hash)
+        return rows[0][0] if rows else None
+
+    def search(self, text, k=4):
+        """Up to k (article_id, title, content, coverage) from the FTS index, best first;
+        coverage is the share of the question's search terms the article contains."""
+        # Trigram FTS needs terms of 3+ characters
+        terms = sorted({t for t in tokenize(text) if len(t) >= 3})
+        if not terms:
+            return []
+        match = " OR ".join('"' + t.replace('"', '""') + '"' for t in terms)
+        rows = self._rows(
+            "SELECT a.id, a.article_title, a.content FROM law_fts JOIN law_articles a ON a.id = law_fts.rowid"
+            " WHERE law_fts MATCH ? ORDER BY bm25(law_fts) LIMIT ?", match, k
+        )
+        results = []
+        for art_id, title, content in rows:
+            haystack = f"{title}\n{content}".lower()
+            results.append((art_id, title, content, sum(t in haystack for t in terms) / len(terms)))
+        return sorted(results, key=lambda r: -r[3])
+
+
+law_snapshot = LawSnapshot() if LAW_SOURCE == 'snapshot' else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the law tables to a read-only SQLite snapshot")
+    parser.add_argument("path", nargs="?", default=SNAPSHOT_PATH)
+    parser.add_argument("--info", action="store_true", help="print the version of an existing snapshot")
+    args = parser.parse_args()
+    if args.info:
+        snap = LawSnapshot(args.path)
+        print(f"{args.path}: version {snap.version}" if snap.open() else f"❌ រកមិនឃើញ snapshot {args.path}")
+    else:
+        try:
+            export(os.getenv('DATABASE_URL'), args.path)
+        except Exception as e:
+            print(f"❌ Snapshot Error: {e}")
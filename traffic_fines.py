@@ -0,0 +1,148 @@
+import json
+import os
+import re
+
+FINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'traffic_fines.json')
+
+# Spaces and zero-width spaces are dropped, so "អត់ ពាក់ មួក" == "អត់ពាក់មួក"
+_SPACE_RE = re.compile(r'[\s\u200b\u200c\u200d]+')
+_LATIN_RE = re.compile(r'[a-z]')
+# A "complied_after" word (e.g. ពាក់ "wearing") still marks a violation after one of these
+NEGATIONS = ('មិន', 'អត់', 'គ្មាន', 'ឥត', 'ពុំ')
+
+
+def normalize(text):
+    return _SPACE_RE.sub('', text).casefold()
+
+
+class KeywordMatcher:
+    """Leftmost-longest multi-keyword matcher. Khmer keywords match anywhere, ignoring
+    spaces (Khmer does not separate words), via an index on their first two chars;
+    Latin keywords only match whole words, so "car" is not found in "scared"."""
+
+    def __init__(self):
+        self._by_prefix = {}
+        self._latin = []
+        self._latin_re = None
+
+    def add(self, keyword, target):
+        keyword = keyword.casefold()
+        if keyword.isascii():
+            self._latin.append((keyword, target))
+            self._latin_re = None
+            return
+        keyword = normalize(keyword)
+        bucket = self._by_prefix.setdefault(keyword[:2], [])
+        bucket.append((keyword, target))
+        bucket.sort(key=lambda kw: -len(kw[0]))
+
+    def _latin_pattern(self):
+        if self._latin_re is None:
+            # Longest first so the alternation is leftmost-longest; "seat belt" also matches "seatbelt"
+            keywords = sorted(enumerate(self._latin), key=lambda kw: -len(kw[1][0]))
+            alternatives = [
+                f"(?P<k{i}>" + r"\s*".join(re.escape(w) for w in keyword.split()) + ")"
+                for i, (keyword, _) in keywords
+            ]
+            self._latin_re = re.compile(r"(?<![a-z0-9])(?:" + "|".join(alternatives) + r")s?(?![a-z0-9])")
+        return self._latin_re
+
+    def find(self, text):
+        """(position, target) for every match in casefolded text, in order; positions
+        count characters of normalize(text), i.e. with the spaces dropped."""
+        stripped = _SPACE_RE.sub('', text)
+        matches = []
+        if self._latin and _LATIN_RE.search(text):
+            matches += [(len(_SPACE_RE.sub('', text[:m.start()])), self._latin[int(m.lastgroup[1:])][1])
+                        for m in self._latin_pattern().finditer(text)]
+        i = 0
+        while i < len(stripped):
+            for keyword, target in self._by_prefix.get(stripped[i:i + 2], ()):
+                if stripped.startswith(keyword, i):
+                    matches.append((i, target))
+                    i += len(keyword) - 1
+                    break
+            i += 1
+        return sorted(matches, key=lambda m: m[0]) if len(matches) > 1 else matches
+
+    def find_all(self, text):
+        """Return the targets matched in text, in order, without duplicates."""
+        found = []
+        for _, target in self.find(text.casefold()):
+            if target not in found:
+                found.append(target)
+        return found
+
+
+def complied(before, prefixes):
+    """True when the text before a match ends in a compliance word such as ពាក់ ("wearing")
+    that is not negated: "ពាក់មួកសុវត្ថិភាព" is compliance, "មិនពាក់មួកសុវត្ថិភាព" is not."""
+    for prefix in prefixes:
+        if before.endswith(prefix):
+            rest = before[:-len(prefix)]
+            rest = rest[:-len('បាន')] if rest.endswith('បាន') else rest
+            return not rest.endswith(NEGATIONS)
+    return False
+
+
+class FineSchedule:
+    def __init__(self, path=FINES_PATH):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        self.source = data['source']
+        self.vehicles = data['vehicles']
+        self.violations = {v['code']: v for v in data['violations']}
+        self._violation_matcher = KeywordMatcher()
+        for v in data['violations']:
+            for keyword in v['keywords'] + [v['name']]:
+                self._violation_matcher.add(keyword, v['code'])
+        self._vehicle_matcher = KeywordMatcher()
+        for vehicle, info in self.vehicles.items():
+            for keyword in info['keywords']:
+                self._vehicle_matcher.add(keyword, vehicle)
+
+    def match(self, violation_text):
+        """Return ([violation codes], vehicle class or None) found in the text."""
+        text = violation_text.casefold()
+        stripped = normalize(text)
+        codes = []
+        for start, code in self._violation_matcher.find(text):
+            if code in codes or complied(stripped[:start], self.violations[code].get('complied_after', ())):
+                continue
+            codes.append(code)
+        vehicles = self._vehicle_matcher.find_all(text)
+        return codes, (vehicles[0] if vehicles else None)
+
+    def calculate(self, violation_text):
+        """Return a Khmer fine summary, or None when no violation is recognised."""
+        codes, vehicle = self.match(violation_text)
+        if not codes:
+            return None
+        lines = ["🧮 ប្រាក់ពិន័យចរាចរណ៍៖\n"]
+        total = 0
+        for code in codes:
+            violation = self.violations[code]
+            fines = violation['fines']
+            if vehicle not in fines and len(fines) == 1:
+                vehicle_for_fine = next(iter(fines))
+            else:
+                vehicle_for_fine = vehicle
+            if vehicle_for_fine in fines:
+                amount = fines[vehicle_for_fine]
+                lines.append(f"• {violation['name']} ({self.vehicles[vehicle_for_fine]['name']}): {amount:,} រៀល")
+                if total is not None:
+                    total += amount
+            else:
+                # Vehicle not mentioned: list the fine for every class
+                lines.append(f"• {violation['name']}:")
+                for veh, amount in fines.items():
+                    lines.append(f"   - {self.vehicles[veh]['name']}: {amount:,} រៀល")
+                total = None
+        if total and len(codes) > 1:
+            lines.append(f"\n💰 សរុប: {total:,} រៀល")
+        lines.append(f"\n📜 យោង៖ {self.source}")
+        lines.append("ℹ️ សូមផ្ទៀងផ្ទាត់ជាមួយសមត្ថកិច្ច ព្រោះចំនួនទឹកប្រាក់អាចមានការកែប្រែ។")
+        return "\n".join(lines)
+
+
+schedule = FineSchedule()
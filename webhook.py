@@ -0,0 +1,93 @@
+import asyncio
+import hmac
+import multiprocessing
+import os
+import signal
+
+from aiohttp import web
+from telegram import Update
+
+from keep_alive import WEB_HOST, WEB_PORT, add_health_routes, start_web_server
+
+# --- CONFIGURATION ---
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')  # public https://.../webhook behind the load balancer
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+WEB_WORKERS = int(os.getenv('WEB_WORKERS', '1'))
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+def build_webhook_app(application, secret_token, path=WEBHOOK_PATH):
+    """aiohttp app that accepts Telegram updates on `path` and serves the health routes."""
+    async def receive_update(request):
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ''), secret_token):
+            return web.Response(status=403)
+        try:
+            update = Update.de_json(await request.json(), application.bot)
+        except Exception as e:
+            print(f"Webhook Error: {e}")
+            return web.Response(status=400)
+        # Answer Telegram right away; the application works through its queue concurrently
+        await application.update_queue.put(update)
+        return web.Response()
+
+    app = web.Application()
+    add_health_routes(app)
+    app.router.add_post(path, receive_update)
+    return app
+
+
+async def serve(application, secret_token, host=WEB_HOST, port=WEB_PORT, webhook_url=None,
+                reuse_port=False, run_hooks=True, stop_event=None):
+    """Run one webhook worker until SIGINT/SIGTERM (or `stop_event`)."""
+    stop_event = stop_event or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    await application.initialize()
+    if run_hooks and application.post_init:
+        await application.post_init(application)
+    await application.start()
+    if webhook_url:
+        await application.bot.set_webhook(webhook_url, secret_token=secret_token, allowed_updates=Update.ALL_TYPES)
+    runner = await start_web_server(build_webhook_app(application, secret_token), host, port, reuse_port)
+    print(f"✅ Webhook worker {os.getpid()} listening on {host}:{port}")
+    try:
+        await stop_event.wait()
+    finally:
+        await runner.cleanup()
+        await application.stop()
+        if run_hooks and application.post_shutdown:
+            await application.post_shutdown(application)
+        await application.shutdown()
+
+
+def _worker(application_factory, register_webhook, reuse_port):
+    asyncio.run(serve(
+        application_factory(),
+        WEBHOOK_SECRET,
+        webhook_url=WEBHOOK_URL if register_webhook else None,
+        reuse_port=reuse_port,
+    ))
+
+
+def run_webhook(application_factory, workers=WEB_WORKERS):
+    """Start `workers` processes sharing WEB_PORT via SO_REUSEPORT; only the first registers the webhook."""
+    if not WEBHOOK_SECRET:
+        print("❌ WEBHOOK_SECRET is required in webhook mode")
+        return
+    if workers <= 1:
+        _worker(application_factory, True, False)
+        return
+    processes = [
+        multiprocessing.Process(target=_worker, args=(application_factory, i == 0, True))
+        for i in range(workers)
+    ]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
@@ -0,0 +1,257 @@
+"""Web search for the AI fallback: pluggable backend, SQLite snippet cache, circuit breaker.
+
+Backends are blocking (`search(query, max_results)` -> [{'title', 'href', 'body'}]) and
+run on a small thread pool of their own (WEB_SEARCH_THREADS). Pick one with WEB_SEARCH_BACKEND=ddgs|fixture.
+"""
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+
+# --- CONFIGURATION ---
+WEB_SEARCH_BACKEND = os.getenv('WEB_SEARCH_BACKEND', 'ddgs')
+WEB_SEARCH_MAX_RESULTS = int(os.getenv('WEB_SEARCH_MAX_RESULTS', '4'))
+WEB_SEARCH_CACHE_DB = os.getenv('WEB_SEARCH_CACHE_DB', 'web_search_cache.db')
+WEB_SEARCH_TTL = float(os.getenv('WEB_SEARCH_TTL', str(3 * 24 * 3600)))
+# Empty result lists are cached too, but briefly
+WEB_SEARCH_EMPTY_TTL = float(os.getenv('WEB_SEARCH_EMPTY_TTL', '3600'))
+WEB_SEARCH_FIXTURES = os.getenv('WEB_SEARCH_FIXTURES', 'web_search_fixtures.json')
+# Searches that may block at once; slow DDGS calls queue here, not in asyncio's default pool
+WEB_SEARCH_THREADS = int(os.getenv('WEB_SEARCH_THREADS', '4'))
+BREAKER_FAILURES = int(os.getenv('WEB_SEARCH_BREAKER_FAILURES', '3'))
+BREAKER_COOLDOWN = float(os.getenv('WEB_SEARCH_BREAKER_COOLDOWN', '60'))
+# Provider said "slow down": stay away longer
+RATE_LIMIT_COOLDOWN = float(os.getenv('WEB_SEARCH_RATE_LIMIT_COOLDOWN', '300'))
+QUERY_SUFFIX = "ច្បាប់កម្ពុជា"
+
+# Zero-width characters Khmer keyboards insert between words, and sentence punctuation
+_INVISIBLE_RE = re.compile('[​‌‍﻿]')
+_PUNCT_RE = re.compile(r'[?!.,;:"\'()\[\]«»“”។៕៖!?]+')
+_WHITESPACE_RE = re.compile(r'\s+')
+# Khmer is written without spaces between words, so spaces users add there don't change the query
+_KHMER_GAP_RE = re.compile(r'(?<=[\u1780-\u17ff])\s+(?=[\u1780-\u17ff])')
+
+
+def normalize_query(text):
+    """Canonical form used as the cache key: NFC, no zero-width chars, punctuation or
+    spaces between Khmer words, casefolded."""
+    text = unicodedata.normalize('NFC', str(text))
+    text = _PUNCT_RE.sub(' ', _INVISIBLE_RE.sub('', text))
+    text = _KHMER_GAP_RE.sub('', _WHITESPACE_RE.sub(' ', text))
+    return text.strip().casefold()
+
+
+class RateLimited(Exception):
+    """A backend was told to back off."""
+
+
+class DDGSBackend:
+    """DuckDuckGo, keeping one DDGS session per worker thread instead of one per question."""
+    name = 'ddgs'
+
+    def __init__(self, region='wt-wt'):
+        self.region = region
+        self._local = threading.local()
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            from duckduckgo_search import DDGS
+            session = self._local.session = DDGS()
+        return session
+
+    def search(self, query, max_results):
+        from duckduckgo_search.exceptions import RatelimitException
+        try:
+            results = self._session().text(f"{query} {QUERY_SUFFIX}", region=self.region,
+                                           safesearch='off', max_results=max_results)
+        except RatelimitException as e:
+            raise RateLimited(str(e)) from e
+        return [{'title': r.get('title', ''), 'href': r.get('href', ''), 'body': r.get('body', '')} for r in results or []]
+
+
+class FixtureBackend:
+    """Canned results from a JSON file {normalized query: [results]}, with "*" as the default.
+    For tests and load benchmarks; never touches the network."""
+    name = 'fixture'
+
+    def __init__(self, fixtures=WEB_SEARCH_FIXTURES, latency=0.0):
+        if isinstance(fixtures, str):
+            with open(fixtures, encoding='utf-8') as f:
+                fixtures = json.load(f)
+        self.fixtures = {normalize_query(k) if k != '*' else k: v for k, v in fixtures.items()}
+        self.latency = latency
+        self.calls = 0
+
+    def search(self, query, max_results):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return self.fixtures.get(query, self.fixtures.get('*', []))[:max_results]
+
+
+BACKENDS = {'ddgs': DDGSBackend, 'fixture': FixtureBackend}
+
+
+class CircuitBreaker:
+    """Opens after `failures` consecutive errors; after the cooldown one trial call is let through.
+    Shared by the search threads, so every transition takes the lock."""
+
+    def __init__(self, failures=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN):
+        self.max_failures = failures
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.failures < self.max_failures:
+            return 'closed'
+        return 'open' if time.monotonic() < self.open_until else 'half_open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self._trial = False
+
+    def failure(self, cooldown=None):
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.failures >= self.max_failures:
+                self.open_until = time.monotonic() + (cooldown or self.cooldown)
+
+
+class SnippetCache:
+    """SQLite table of search results keyed by (backend, normalized query), with expiry."""
+
+    def __init__(self, db_path=WEB_SEARCH_CACHE_DB):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._connection = None
+
+    @property
+    def _db(self):
+        # Opened on first search, so importing the bot creates no file
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS web_search_cache "
+                "(backend TEXT, query TEXT, results TEXT, expires_at REAL, PRIMARY KEY (backend, query))"
+            )
+            self._connection.commit()
+        return self._connection
+
+    def get(self, backend, query):
+        """(results, fresh) or (None, False); expired rows are still returned for stale fallback."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT results, expires_at FROM web_search_cache WHERE backend = ? AND query = ?", (backend, query)
+            ).fetchone()
+        if row is None:
+            return None, False
+        return json.loads(row[0]), row[1] > time.time()
+
+    def set(self, backend, query, results):
+        ttl = WEB_SEARCH_TTL if results else WEB_SEARCH_EMPTY_TTL
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO web_search_cache (backend, query, results, expires_at) VALUES (?, ?, ?, ?)",
+                (backend, query, json.dumps(results, ensure_ascii=False), time.time() + ttl)
+            )
+            self._db.commit()
+
+    def purge_expired(self, keep_seconds=7 * 24 * 3600):
+        """Drop rows that expired more than keep_seconds ago (younger ones serve stale fallbacks)."""
+        with self._lock:
+            self._db.execute("DELETE FROM web_search_cache WHERE expires_at <= ?", (time.time() - keep_seconds,))
+            self._db.commit()
+
+
+class WebSearch:
+    def __init__(self, backend=None, cache=None, breaker=None, max_results=WEB_SEARCH_MAX_RESULTS,
+                 threads=WEB_SEARCH_THREADS):
+        self.backend = backend or BACKENDS[WEB_SEARCH_BACKEND]()
+        self.cache = cache if cache is not None else SnippetCache()
+        self.breaker = breaker or CircuitBreaker()
+        self.max_results = max_results
+        self.outcomes = Counter()
+        self._outcomes_lock = threading.Lock()
+        # Threads start on first use; a search cancelled by the orchestrator still holds one
+        # until DDGS returns, so it is these threads that fill up, not the default pool
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='websearch')
+
+    async def search(self, question):
+        """Results for the question, from cache when fresh; never raises."""
+        query = normalize_query(question)
+        if not query:
+            return []
+        # Like asyncio.to_thread, carry the context over so metrics land on this request
+        call = functools.partial(contextvars.copy_context().run, self._search, query)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+    def _count(self, outcome):
+        with self._outcomes_lock:
+            self.outcomes[outcome] += 1
+
+    def _search(self, query):
+        cached, fresh = self.cache.get(self.backend.name, query)
+        if fresh:
+            self._count('cache_hit')
+            return cached
+        if not self.breaker.allow():
+            return self._stale(cached, 'breaker_open')
+        try:
+            with metrics.timer(f"web.{self.backend.name}"):
+                results = self.backend.search(query, self.max_results)
+        except RateLimited as e:
+            print(f"Search Rate Limited: {e}")
+            self.breaker.failure(RATE_LIMIT_COOLDOWN)
+            return self._stale(cached, 'rate_limited')
+        except Exception as e:
+            print(f"Search Error: {e}")
+            self.breaker.failure()
+            return self._stale(cached, 'error')
+        self.breaker.success()
+        self._count('fetched')
+        self.cache.set(self.backend.name, query, results)
+        return results
+
+    def _stale(self, cached, reason):
+        # An expired answer beats answering with no context at all
+        self._count('stale' if cached else reason)
+        return cached or []
+
+
+searcher = WebSearch()
+
+metrics.collect('lawbot_web_search_total', 'Web searches by outcome.', lambda: searcher.outcomes, kind='counter', label='outcome')
+metrics.collect('lawbot_web_search_breaker_open', '1 while the search circuit breaker is open.',
+                lambda: int(searcher.breaker.state == 'open'))